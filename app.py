@@ -1,11 +1,18 @@
 import streamlit as st
 import requests
 import os
+import json
+import time
+from collections import deque
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Load environment variables
 load_dotenv()
 BACKEND_URL = "http://127.0.0.1:5000"
+# Seconds a read (leave lists) is reused across reruns before revalidating with the backend
+READ_CACHE_TTL = 10
 
 
 # ✅ Login Page
@@ -32,10 +39,93 @@ def navigation_bar():
     col1, col2, col3 = st.columns([1, 3, 1])
     with col1:
         if st.button("🔄 Refresh"):
+            invalidate_reads()
             st.rerun()  # Updated from experimental_rerun
     with col3:
         if st.button("🚪 Logout"):
             logout()
+    show_call_timings()
+
+# ✅ Backend Client (one pooled keep-alive session per process)
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    # Only idempotent reads are retried automatically
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=frozenset(["GET"]))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def get_call_timings():
+    return deque(maxlen=50)
+
+
+@st.cache_resource
+def get_etag_store():
+    return {}
+
+
+def api(method, path, **kwargs):
+    """Call the backend through the pooled session and record how long the call took."""
+    kwargs.setdefault("timeout", 60)
+    start = time.perf_counter()
+    response = get_session().request(method, f"{BACKEND_URL}{path}", **kwargs)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    get_call_timings().append((method, path, response.status_code, round(elapsed_ms, 1)))
+    return response
+
+
+@st.cache_data(ttl=READ_CACHE_TTL, show_spinner=False)
+def cached_get(path, params):
+    """Cached read endpoint. After the TTL the last copy is revalidated with If-None-Match."""
+    store = get_etag_store()
+    key = (path, params)
+    cached = store.get(key)
+    headers = {"If-None-Match": cached["etag"]} if cached else {}
+
+    response = api("GET", path, params=dict(params), headers=headers)
+    if response.status_code == 304 and cached:
+        return cached["data"]
+    if response.status_code != 200:
+        return None
+
+    data = response.json()
+    if response.headers.get("ETag"):
+        store[key] = {"etag": response.headers["ETag"], "data": data}
+    return data
+
+
+def invalidate_reads():
+    """Drop cached reads after a mutation so the next render shows fresh data."""
+    cached_get.clear()
+
+
+def show_call_timings():
+    with st.sidebar.expander("⏱️ Backend calls"):
+        for method, path, status, elapsed_ms in reversed(get_call_timings()):
+            st.write(f"`{method} {path}` → {status} in {elapsed_ms} ms")
+
+# ✅ Stream Academic Answer (server-sent events)
+def stream_academic_answer(question):
+    with api(
+        "POST", "/academic",
+        json={"student_id": st.session_state["username"], "query": question, "stream": True},
+        stream=True
+    ) as response:
+        if response.status_code != 200:
+            yield "❌ AI Error. Please try again."
+            return
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if "token" in event:
+                yield event["token"]
+            elif "error" in event:
+                yield event["error"]
 
 # ✅ Student Dashboard
 def student_dashboard():
@@ -47,32 +137,34 @@ def student_dashboard():
     st.subheader("📚 Ask an Academic Question")
     question = st.text_input("Enter your question:")
     if st.button("Ask"):
-        with st.spinner("🤖 Processing..."):
-            response = requests.post(f"{BACKEND_URL}/academic", json={"student_id": st.session_state["username"], "query": question})
-            if response.status_code == 200:
-                st.success(response.json().get("response", "❌ Error processing AI response."))
-            else:
-                st.error("❌ AI Error. Please try again.")
+        # Render tokens as they arrive instead of waiting for the full answer
+        st.write_stream(stream_academic_answer(question))
 
     # 📝 Request Leave
     st.subheader("📝 Request Leave")
     leave_days = st.number_input("Number of Leave Days", min_value=1, step=1)
     if st.button("Apply Leave"):
-        response = requests.post(f"{BACKEND_URL}/leave", json={"student_id": st.session_state["username"], "days": leave_days})
+        response = api("POST", "/leave", json={"student_id": st.session_state["username"], "days": leave_days})
+        invalidate_reads()
         if response.status_code == 200:
             st.success(response.json().get("message", "❌ Error processing response."))
+        elif response.status_code in (400, 409):
+            # No mentor assigned, or the leave overlaps one already pending/approved
+            st.error(response.json()["message"])
         else:
             st.error("❌ Backend error.")
 
     # 📌 Leave Status
     st.subheader("📌 Your Leave Requests")
-    response = requests.get(f"{BACKEND_URL}/student-leave-status", params={"student_id": st.session_state["username"]})
+    data = cached_get("/student-leave-status", (("limit", 100), ("student_id", st.session_state["username"])))
 
-    if response.status_code == 200:
-        leave_requests = response.json().get("requests", [])
+    if data is not None:
+        leave_requests = data.get("requests", [])
         if leave_requests:
             for req in leave_requests:
                 st.write(f"📌 **Mentor:** {req['mentor_id']} | **Days:** {req['days']} | **Status:** {req['status']}")
+            if data.get("next_cursor"):
+                st.caption("Showing your first 100 leave requests.")
         else:
             st.write("No leave requests found.")
     else:
@@ -103,19 +195,15 @@ def student_dashboard():
             files = {"template": ("template.pdf", custom_template, "application/pdf")}
 
         if files:
-            response = requests.post(f"{BACKEND_URL}/certificate", data=payload, files=files, stream=True)
+            response = api("POST", "/certificate", data=payload, files=files)
         else:
-            response = requests.post(f"{BACKEND_URL}/certificate", json=payload, stream=True)
+            response = api("POST", "/certificate", json=payload)
 
         if response.status_code == 200:
-            # Save the generated certificate locally
+            # Hand the PDF bytes straight to the download button
             cert_filename = f"{st.session_state['username']}_certificate.pdf"
-            with open(cert_filename, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-
             st.success("✅ Certificate generated successfully!")
-            st.download_button("📥 Download Certificate", open(cert_filename, "rb"), file_name=cert_filename, mime="application/pdf")
+            st.download_button("📥 Download Certificate", response.content, file_name=cert_filename, mime="application/pdf")
 
         else:
             st.error("❌ Error generating certificate. Please try again.")
@@ -129,27 +217,76 @@ def mentor_dashboard():
 
     # 📌 Leave Requests
     st.subheader("📌 Pending Leave Requests")
-    response = requests.get(f"{BACKEND_URL}/mentor-leave-requests", params={"mentor_id": st.session_state["username"]})
+    data = cached_get("/mentor-leave-requests", (("limit", 100), ("mentor_id", st.session_state["username"])))
 
-    if response.status_code == 200:
-        leave_requests = response.json().get("requests", [])
+    if data is not None:
+        leave_requests = data.get("requests", [])
         if leave_requests:
+            if data.get("next_cursor"):
+                st.caption("Showing the oldest 100 pending requests.")
             for req in leave_requests:
-                st.write(f"📌 **Student:** {req['student_id']} | **Days:** {req['days']} | **Status:** {req['status']}")
+                st.write(f"📌 **#{req['id']} Student:** {req['student_id']} | **Days:** {req['days']} | **Status:** {req['status']}")
+
+            # Bulk actions: selecting requests doesn't rerun the page until a button is pressed
+            labels = {req["id"]: f"#{req['id']} {req['student_id']} ({req['days']} days)" for req in leave_requests}
+            with st.form("leave_decisions"):
+                selected = st.multiselect("Select requests:", list(labels), format_func=labels.get)
                 col1, col2 = st.columns(2)
                 with col1:
-                    if st.button(f"✅ Approve {req['id']}"):
-                        requests.post(f"{BACKEND_URL}/approve-leave", json={"leave_id": req["id"]})
-                        st.success("✅ Leave Approved!")
+                    approve = st.form_submit_button("✅ Approve Selected")
                 with col2:
-                    if st.button(f"❌ Reject {req['id']}"):
-                        requests.post(f"{BACKEND_URL}/reject-leave", json={"leave_id": req["id"]})
-                        st.error("❌ Leave Rejected!")
+                    reject = st.form_submit_button("❌ Reject Selected")
+
+            if (approve or reject) and selected:
+                decision = "approve" if approve else "reject"
+                response = api(
+                    "POST", "/leave/decisions",
+                    json={
+                        "mentor_id": st.session_state["username"],
+                        "decisions": [{"leave_id": leave_id, "decision": decision} for leave_id in selected],
+                    }
+                )
+                invalidate_reads()
+                if response.status_code == 200:
+                    st.success(response.json().get("message", "✅ Decisions applied."))
+                    st.rerun()
+                else:
+                    st.error("❌ Error applying decisions.")
         else:
             st.write("No pending leave requests.")
     else:
         st.error("❌ Error fetching leave requests.")
 
+# ✅ Poll Background Job Progress
+def poll_job(job_id):
+    status = st.empty()
+    while True:
+        response = api("GET", f"/jobs/{job_id}")
+        if response.status_code != 200:
+            status.error("❌ Error fetching job status.")
+            return
+        job = response.json()
+        progress = f"{job['rows_done']} rows, {job['pages_done']} pages"
+        if job["rows_per_sec"]:
+            progress += f" ({job['rows_per_sec']} rows/s)"
+
+        if job["status"] == "done":
+            status.success(upload_summary(job["result"]) if job["result"] else f"✅ AI Training Data Uploaded Successfully. {progress}")
+            return
+        if job["status"] == "failed":
+            status.error(f"❌ Error processing file: {job['error']}")
+            return
+        status.info(f"⏳ {job['status'].capitalize()}: {progress}")
+        time.sleep(1)
+
+def upload_summary(counts):
+    if counts["skipped"]:
+        return f"✅ {counts['source']} is already up to date; nothing to upload."
+    return (
+        f"✅ AI Training Data Uploaded Successfully. {counts['source']}: {counts['chunks']} chunks, "
+        f"{counts['new_chunks']} new, {counts['removed_chunks']} removed."
+    )
+
 # ✅ Admin Dashboard
 def admin_dashboard():
     st.title("⚙️ Admin Dashboard")
@@ -158,25 +295,66 @@ def admin_dashboard():
     # 📂 Upload AI Training Data
     st.subheader("📂 Upload AI Training Data (JSON/CSV/Excel/PDF)")
     uploaded_file = st.file_uploader("Upload JSON/CSV/Excel/PDF File", type=["csv", "xlsx", "json", "pdf"])
+    # Uploading under an existing source name replaces that source
+    source = st.text_input("Source name (defaults to the file name):")
     if uploaded_file and st.button("Upload"):
         files = {"file": (uploaded_file.name, uploaded_file.getvalue())}
-        response = requests.post(f"{BACKEND_URL}/upload-data", files=files)
-        if response.status_code == 200:
-            st.success(response.json().get("message", "✅ File uploaded successfully!"))
+        response = api("POST", "/upload-data", data={"source": source}, files=files)
+        if response.status_code == 202:
+            poll_job(response.json()["job_id"])
+        elif response.status_code == 200:
+            st.success(upload_summary(response.json()))
         else:
             st.error("❌ Error processing file.")
 
+    # 🗂️ Academic Sources
+    with st.expander("🗂️ Academic Sources"):
+        response = api("GET", "/academic-sources")
+        if response.status_code == 200:
+            data = response.json()
+            st.caption(f"{data['unique_chunks']} unique chunks in the corpus.")
+            for item in data["sources"]:
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    st.write(f"📄 **{item['name']}** | {item['chunks']} chunks | {item['status']} | {item['created_at']}")
+                with col2:
+                    if st.button("🗑️ Delete", key=f"delete_source_{item['name']}"):
+                        response = api("DELETE", f"/academic-sources/{item['name']}")
+                        if response.status_code == 200:
+                            st.rerun()
+                        else:
+                            st.error("❌ Error deleting source.")
+        else:
+            st.error("❌ Error fetching sources.")
+
     # 👨‍🏫 Assign Mentors
     st.subheader("👨‍🏫 Assign Mentors to Students")
     student_id = st.text_input("Enter Student ID:")
     mentor_id = st.text_input("Enter Mentor ID:")
     if st.button("Assign Mentor"):
-        response = requests.post(f"{BACKEND_URL}/assign-mentor", json={"student_id": student_id, "mentor_id": mentor_id})
+        response = api("POST", "/assign-mentor", json={"student_id": student_id, "mentor_id": mentor_id})
+        invalidate_reads()
         if response.status_code == 200:
             st.success(response.json().get("message", "✅ Mentor assigned successfully!"))
         else:
             st.error("❌ Error assigning mentor.")
 
+    mentor_file = st.file_uploader("Bulk import (CSV with student_id,mentor_id or JSON)", type=["csv", "json"])
+    if mentor_file and st.button("Import Assignments"):
+        response = api("POST", "/assign-mentors", files={"file": (mentor_file.name, mentor_file.getvalue())})
+        invalidate_reads()
+        result = response.json()
+        if response.status_code == 200:
+            st.success(
+                f"✅ {result['rows']} rows: {result['inserted']} inserted, {result['updated']} updated, "
+                f"{result['unchanged']} unchanged ({result['rows_per_sec']} rows/s). "
+                f"{result['leaves_reassigned']} pending leaves reassigned."
+            )
+        else:
+            st.error(result.get("message", "❌ Error importing assignments."))
+        if result.get("errors"):
+            st.json(result["errors"])
+
     # 📜 Manage Certificate Templates
     st.subheader("📜 Manage Certificate Templates")
     template_type = st.selectbox("Template Type:", ["Bonafide", "NOC"])
@@ -184,13 +362,23 @@ def admin_dashboard():
 
     if template_file and st.button("Set Default Template"):
         files = {"template": (template_file.name, template_file.getvalue())}
-        response = requests.post(
-            f"{BACKEND_URL}/set-template",
+        response = api(
+            "POST", "/set-template",
             data={"template_type": template_type},
             files=files
         )
         if response.status_code == 200:
+            template = response.json()["template"]
             st.success("✅ Default template updated successfully!")
+            st.caption(
+                f"Page {template['page_width']:.0f}×{template['page_height']:.0f} pt · "
+                f"{template['source_bytes'] / 1024:.0f} KB → {template['template_bytes'] / 1024:.0f} KB "
+                f"in {template['prepare_ms']} ms"
+            )
+        elif response.headers.get("Content-Type", "").startswith("application/json"):
+            # Rejected template: show why (sizes, page count, preprocessing time)
+            st.error(response.json()["message"])
+            st.json(response.json().get("diagnostics", {}))
         else:
             st.error("❌ Error updating template.")
 
@@ -1,42 +1,410 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g, has_app_context
 import sqlite3
 import os
 import datetime
-import pandas as pd
 import json
 import time
-import PyPDF2
 from dotenv import load_dotenv
-from groq import Groq
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
 import io
+import hashlib
+import threading
+import zipfile
+import tempfile
+import queue
+import re
+import sys
+import uuid
+import socket
+import csv
+import shutil
+import string
+import bisect
+import importlib
+import itertools
+import multiprocessing
+import random
+from contextlib import nullcontext
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+# pandas, PyPDF2, reportlab and groq are imported inside the functions that use them, so a
+# worker only loads what it actually serves (create_app(warm=True) loads them up front)
+HEAVY_MODULES = ("pandas", "PyPDF2", "reportlab.pdfgen.canvas", "groq")
 
 # Load environment variables
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-# Initialize Flask App & Groq Client
+# Initialize Flask App (the Groq client is created on first use, see get_llm_client)
 app = Flask(__name__)
-client = Groq(api_key=GROQ_API_KEY)
+client = None
+client_lock = threading.Lock()
 
-# Create templates directory if it doesn't exist
+# Certificate templates directory (created by create_app)
 TEMPLATES_DIR = os.path.join(os.getcwd(), "templates")
-if not os.path.exists(TEMPLATES_DIR):
-    os.makedirs(TEMPLATES_DIR)
+
+# Memory cap for compiled certificate templates (bytes)
+TEMPLATE_CACHE_MAX_BYTES = int(os.getenv("TEMPLATE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Stored template limits (bytes as uploaded, bytes after optimization)
+TEMPLATE_MAX_UPLOAD_BYTES = int(os.getenv("TEMPLATE_MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+TEMPLATE_MAX_BYTES = int(os.getenv("TEMPLATE_MAX_BYTES", 2 * 1024 * 1024))
+# Allowance for multipart boundaries and form fields on top of the template file itself
+TEMPLATE_UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+# Bulk certificate rendering (process pool size, students per task, max students per batch)
+CERT_BATCH_WORKERS = int(os.getenv("CERT_BATCH_WORKERS", os.cpu_count() or 1))
+CERT_BATCH_CHUNK = int(os.getenv("CERT_BATCH_CHUNK", 50))
+CERT_BATCH_MAX = int(os.getenv("CERT_BATCH_MAX", 20000))
+batch_pool = None
+batch_pool_lock = threading.Lock()
+
+# Rendered certificate cache on disk (directory, size cap) and how long Idempotency-Key replays are honoured
+CERT_ARTIFACT_DIR = os.getenv("CERT_ARTIFACT_DIR", os.path.join(os.getcwd(), "certificate_artifacts"))
+CERT_ARTIFACT_MAX_BYTES = int(os.getenv("CERT_ARTIFACT_MAX_BYTES", 512 * 1024 * 1024))
+CERT_IDEMPOTENCY_TTL = int(os.getenv("CERT_IDEMPOTENCY_TTL", 24 * 3600))
+
+# Retrieval for /academic (chunk size/overlap in characters, chunks per query, context budget)
+ACADEMIC_CHUNK_CHARS = int(os.getenv("ACADEMIC_CHUNK_CHARS", 1000))
+ACADEMIC_CHUNK_OVERLAP = int(os.getenv("ACADEMIC_CHUNK_OVERLAP", 150))
+ACADEMIC_TOP_K = int(os.getenv("ACADEMIC_TOP_K", 8))
+ACADEMIC_CONTEXT_TOKENS = int(os.getenv("ACADEMIC_CONTEXT_TOKENS", 1000))
+
+# Rows per transaction when ingesting CSV/XLSX uploads
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", 5000))
+
+# Rows per transaction when bulk-importing mentor assignments
+MENTOR_IMPORT_CHUNK_ROWS = int(os.getenv("MENTOR_IMPORT_CHUNK_ROWS", 5000))
+
+# Background jobs ("inprocess" runs workers in each web process, "external" expects `python backend.py worker`)
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "inprocess")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 300))
+# A running job's heartbeat is refreshed this often, progress or not
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", JOB_STALE_SECONDS / 3))
+JOBS_DIR = os.path.join(os.getcwd(), "job_files")
+
+# Leave listing page size (default and maximum)
+LEAVE_PAGE_SIZE = int(os.getenv("LEAVE_PAGE_SIZE", 50))
+LEAVE_PAGE_MAX = int(os.getenv("LEAVE_PAGE_MAX", 500))
+
+# How long leave Idempotency-Key replays are honoured (seconds)
+LEAVE_IDEMPOTENCY_TTL = int(os.getenv("LEAVE_IDEMPOTENCY_TTL", 24 * 3600))
+
+# Rows fetched per batch when streaming report exports
+REPORT_EXPORT_BATCH = int(os.getenv("REPORT_EXPORT_BATCH", 10000))
+
+# Model used for /academic
+ACADEMIC_MODEL = os.getenv("ACADEMIC_MODEL", "llama-3.3-70b-versatile")
+
+# LLM call execution (concurrent calls and queued calls per process, seconds, attempts)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", 4))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 1))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", 0.5))
+LLM_RETRY_AFTER = int(os.getenv("LLM_RETRY_AFTER", 5))
+
+# Persistent /academic answer cache
+ACADEMIC_CACHE_TTL = int(os.getenv("ACADEMIC_CACHE_TTL", 7 * 24 * 3600))
+ACADEMIC_CACHE_MAX_ENTRIES = int(os.getenv("ACADEMIC_CACHE_MAX_ENTRIES", 10000))
+
+# SQLite connection pool settings
+DB_PATH = os.getenv("DB_PATH", "leave_management.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 10000))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 16384))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 256 * 1024 * 1024))
+
+# Request metrics (off disables timing entirely; slow requests over METRICS_SLOW_MS are logged at METRICS_SLOW_SAMPLE rate)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+METRICS_SLOW_MS = float(os.getenv("METRICS_SLOW_MS", 1000))
+METRICS_SLOW_SAMPLE = float(os.getenv("METRICS_SLOW_SAMPLE", 1.0))
+
+# ✅ Request Metrics
+class Histogram:
+    """Prometheus-style histogram keyed by a tuple of label values."""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, labels, seconds):
+        index = bisect.bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                series = self._series[labels] = [[0] * (len(self.BUCKETS) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.BUCKETS + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+class Metrics:
+    """In-process request and span timings for /metrics (per process; scrape each worker)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Histogram(
+            "backend_request_duration_seconds", "Time to build the response, by route.", ("route", "method")
+        )
+        self.spans = Histogram(
+            "backend_span_duration_seconds", "Time spent in instrumented stages (db, pdf, llm, file).", ("span",)
+        )
+        self.responses = {}
+        self.slow_requests = 0
+
+    def observe_request(self, route, method, status, seconds, slow):
+        self.requests.observe((route, method), seconds)
+        with self._lock:
+            key = (route, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            if slow:
+                self.slow_requests += 1
+
+    def render(self):
+        lines = self.requests.render() + self.spans.render()
+        lines += ["# HELP backend_responses_total Responses sent, by route and status.", "# TYPE backend_responses_total counter"]
+        with self._lock:
+            responses = sorted(self.responses.items())
+            slow_requests = self.slow_requests
+        for (route, method, status), count in responses:
+            lines.append(f'backend_responses_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+        lines += [
+            "# HELP backend_slow_requests_total Requests slower than METRICS_SLOW_MS.",
+            "# TYPE backend_slow_requests_total counter",
+            f"backend_slow_requests_total {slow_requests}",
+        ]
+        return lines
+
+
+metrics = Metrics()
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        metrics.spans.observe((self.name,), elapsed)
+        if has_app_context() and "spans" in g:
+            g.spans[self.name] = g.spans.get(self.name, 0.0) + elapsed
+
+
+def span(name):
+    """Time a stage of the current request (e.g. span("pdf.render")); a no-op when metrics are off."""
+    return Span(name) if METRICS_ENABLED else nullcontext()
+
+
+@app.before_request
+def start_request_timer():
+    if METRICS_ENABLED:
+        g.request_start = time.perf_counter()
+        g.spans = {}
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get("request_start")
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    slow = elapsed * 1000 >= METRICS_SLOW_MS
+    metrics.observe_request(route, request.method, response.status_code, elapsed, slow)
+
+    if slow and random.random() < METRICS_SLOW_SAMPLE:
+        app.logger.warning("slow request %s", json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "ms": round(elapsed * 1000, 1),
+            "spans_ms": {name: round(seconds * 1000, 1) for name, seconds in g.spans.items()},
+        }))
+    return response
+
+
+# ✅ Database Connection Pool
+class PooledConnection:
+    """sqlite3 connection borrowed from the pool; close() hands it back."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def execute(self, *args):
+        with span("db.query"):
+            return self._conn.execute(*args)
+
+    def executemany(self, *args):
+        with span("db.query"):
+            return self._conn.executemany(*args)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections with pragmas applied once at connect time."""
+
+    def __init__(self, path, size, timeout):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Connections must never cross a fork, so a new process starts with an empty pool
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self.created = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB};")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE};")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS};")
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            can_create = self._idle.empty() and self.created < self.size
+            if can_create:
+                self.created += 1
+
+        if can_create:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self.created -= 1
+                raise
+        else:
+            start = time.perf_counter()
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    self.waits += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise sqlite3.OperationalError("database connection pool exhausted")
+                finally:
+                    with self._lock:
+                        self.wait_seconds += time.perf_counter() - start
+
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self.in_use -= 1
+        self._idle.put(conn)
+
+    def close_idle(self):
+        """Close every idle connection, e.g. before forking so none are inherited."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self.created -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self.created,
+                "in_use": self.in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 6),
+                "timeouts": self.timeouts,
+            }
+
+
+db_pool = ConnectionPool(DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT)
 
 # ✅ Database Connection
 def get_db_connection():
-    conn = sqlite3.connect("leave_management.db", timeout=10, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL;")
+    with span("db.connect"):
+        conn = db_pool.acquire()
+    # Remember the connection so teardown can return it if a route exits early
+    if has_app_context():
+        g.setdefault("db_connections", []).append(conn)
     return conn
 
-# ✅ Create Tables If Not Exists
-def initialize_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
 
+@app.teardown_appcontext
+def release_db_connections(exc):
+    for conn in g.pop("db_connections", []):
+        conn.close()
+
+# ✅ Create Tables If Not Exists
+def create_tables(cursor):
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS leave_requests (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -71,12 +439,718 @@ def initialize_db():
         )
     """)
 
+# ✅ Academic Retrieval Index
+def chunk_text(text, size=None, overlap=None):
+    """Split text into overlapping chunks of roughly `size` characters, breaking on whitespace."""
+    size = size or ACADEMIC_CHUNK_CHARS
+    overlap = ACADEMIC_CHUNK_OVERLAP if overlap is None else overlap
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            split = text.rfind(" ", start + size // 2, end)
+            if split != -1:
+                end = split
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return [chunk for chunk in chunks if chunk]
+
+
+def chunk_hash(chunk):
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+class SourceConflict(Exception):
+    """An upload that clashes with another upload or a delete of the same academic source."""
+
+
+def upload_abandoned(cursor, upload_id, created_at):
+    """Whether the upload behind a 'loading' source is dead.
+
+    A job upload is dead once its job is no longer running or has stopped heartbeating; a synchronous
+    upload (no job row) once it started more than JOB_STALE_SECONDS ago.
+    """
+    cursor.execute("SELECT status, heartbeat_at FROM jobs WHERE id = ?", (upload_id,))
+    job = cursor.fetchone()
+    if job is not None:
+        return job["status"] != "running" or (job["heartbeat_at"] or 0) < time.time() - JOB_STALE_SECONDS
+    if not created_at:
+        return True
+    age = datetime.datetime.now() - datetime.datetime.fromisoformat(created_at)
+    return age.total_seconds() > JOB_STALE_SECONDS
+
+
+def start_source(conn, name, filename, upload_id, content_hash):
+    """Register a new version of source `name` in 'loading' state and return its ID.
+
+    Returns None when the live version of `name` already has this content_hash (an identical re-upload).
+    Raises SourceConflict while another upload of `name` is still loading. Loading versions left by a
+    dead upload, or by an earlier run of this same upload_id (a requeued job), are dropped instead.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(
+            "SELECT id, upload_id, created_at FROM academic_sources WHERE name = ? AND status = 'loading'", (name,)
+        )
+        loading = cursor.fetchall()
+        abandoned = [
+            row["id"] for row in loading
+            if (upload_id is not None and row["upload_id"] == upload_id)
+            or upload_abandoned(cursor, row["upload_id"], row["created_at"])
+        ]
+        if len(abandoned) < len(loading):
+            raise SourceConflict(f"An upload of {name} is already in progress.")
+        drop_sources(cursor, abandoned)
+
+        cursor.execute(
+            "SELECT id FROM academic_sources WHERE name = ? AND status = 'active' AND content_hash = ?",
+            (name, content_hash)
+        )
+        if cursor.fetchone():
+            cursor.execute("COMMIT")
+            return None
+        cursor.execute(
+            "INSERT INTO academic_sources (name, filename, upload_id, content_hash, status, created_at) "
+            "VALUES (?, ?, ?, ?, 'loading', ?)",
+            (name, filename, upload_id, content_hash, datetime.datetime.now().isoformat(timespec="seconds"))
+        )
+        source_id = cursor.lastrowid
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return source_id
+
+
+def store_documents(conn, source_id, documents):
+    """File (locator, text) documents under source_id as hashed chunks, in one IMMEDIATE transaction.
+
+    A chunk whose content is already in the corpus (from any source) is only referenced, never stored twice.
+    Returns (chunks referenced, chunks newly stored).
+    """
+    chunks = {}
+    refs = []
+    for locator, text in documents:
+        for position, chunk in enumerate(chunk_text(text)):
+            digest = chunk_hash(chunk)
+            chunks[digest] = chunk
+            refs.append((source_id, locator, position, digest))
+
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("SELECT 1 FROM academic_sources WHERE id = ? AND status = 'loading'", (source_id,))
+        if not cursor.fetchone():
+            raise SourceConflict("The source was deleted while it was being uploaded.")
+        cursor.executemany(
+            "INSERT INTO academic_chunks (content, content_hash) VALUES (?, ?) ON CONFLICT (content_hash) DO NOTHING",
+            [(chunk, digest) for digest, chunk in chunks.items()]
+        )
+        new_chunks = max(cursor.rowcount, 0)
+        cursor.executemany("""
+            INSERT OR IGNORE INTO academic_chunk_refs (source_id, locator, position, chunk_id)
+            SELECT ?, ?, ?, id FROM academic_chunks WHERE content_hash = ?
+        """, refs)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return len(refs), new_chunks
+
+
+def drop_sources(cursor, source_ids):
+    """Delete sources, their chunk references and the chunks no other source still uses.
+
+    The caller holds the write transaction. Returns the number of chunks removed.
+    """
+    removed = 0
+    for source_id in source_ids:
+        cursor.execute("SELECT DISTINCT chunk_id FROM academic_chunk_refs WHERE source_id = ?", (source_id,))
+        chunk_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("DELETE FROM academic_chunk_refs WHERE source_id = ?", (source_id,))
+        cursor.execute("DELETE FROM academic_sources WHERE id = ?", (source_id,))
+        cursor.executemany(
+            "DELETE FROM academic_chunks WHERE id = ? "
+            "AND NOT EXISTS (SELECT 1 FROM academic_chunk_refs WHERE chunk_id = ?)",
+            [(chunk_id, chunk_id) for chunk_id in chunk_ids]
+        )
+        removed += max(cursor.rowcount, 0)
+    return removed
+
+
+def finish_source(conn, source_id, name):
+    """Make source_id the live version of `name`, dropping earlier versions. Returns chunks removed.
+
+    Raises SourceConflict if source_id itself was deleted while loading.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("UPDATE academic_sources SET status = 'active' WHERE id = ? AND status = 'loading'", (source_id,))
+        if cursor.rowcount != 1:
+            raise SourceConflict("The source was deleted while it was being uploaded.")
+        cursor.execute("SELECT id FROM academic_sources WHERE name = ? AND id < ?", (name, source_id))
+        removed = drop_sources(cursor, [row[0] for row in cursor.fetchall()])
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return removed
+
+
+# Chunks of uploads still loading are not retrieved until the upload finishes
+ACTIVE_CHUNK = """
+    EXISTS (
+        SELECT 1 FROM academic_chunk_refs r JOIN academic_sources s ON s.id = r.source_id
+        WHERE r.chunk_id = c.id AND s.status = 'active'
+    )
+"""
+
+
+def retrieve_context(cursor, query, top_k=None, token_budget=None):
+    """Best-matching chunks for query (FTS5 BM25), joined up to the token budget."""
+    top_k = top_k or ACADEMIC_TOP_K
+    char_budget = (token_budget or ACADEMIC_CONTEXT_TOKENS) * 4  # ~4 characters per token
+
+    terms = re.findall(r"\w+", query.lower())
+    rows = []
+    with span("db.query"):
+        if terms:
+            match = " OR ".join(f'"{term}"' for term in terms)
+            cursor.execute(f"""
+                SELECT c.content FROM academic_chunks_fts
+                JOIN academic_chunks c ON c.id = academic_chunks_fts.rowid
+                WHERE academic_chunks_fts MATCH ? AND {ACTIVE_CHUNK}
+                ORDER BY rank
+                LIMIT ?
+            """, (match, top_k))
+            rows = cursor.fetchall()
+
+        if not rows:
+            # Nothing matched; fall back to the first chunks so the model still gets some context
+            cursor.execute(f"SELECT c.content FROM academic_chunks c WHERE {ACTIVE_CHUNK} ORDER BY c.id LIMIT ?", (top_k,))
+            rows = cursor.fetchall()
+
+    context = []
+    used = 0
+    for row in rows:
+        chunk = row[0][:char_budget - used]
+        if not chunk:
+            break
+        context.append(chunk)
+        used += len(chunk)
+    return "\n---\n".join(context)
+
+
+def backfill_academic_chunks(cursor):
+    cursor.execute("SELECT id, content FROM academic_docs WHERE content IS NOT NULL")
+    for doc_id, content in cursor.fetchall():
+        cursor.executemany(
+            "INSERT INTO academic_chunks (doc_id, chunk_index, content) VALUES (?, ?, ?)",
+            [(doc_id, i, chunk) for i, chunk in enumerate(chunk_text(content))]
+        )
+
+
+def backfill_chunk_sources(cursor):
+    """Hash existing chunks, drop duplicate copies and file them all under a single 'legacy' source."""
+    cursor.execute("SELECT id, doc_id, chunk_index, content FROM academic_chunks ORDER BY id")
+    rows = cursor.fetchall()
+    if not rows:
+        return
+    cursor.execute(
+        "INSERT INTO academic_sources (name, status, created_at) VALUES ('legacy', 'active', ?)",
+        (datetime.datetime.now().isoformat(timespec="seconds"),)
+    )
+    source_id = cursor.lastrowid
+
+    kept = {}
+    duplicates = []
+    refs = []
+    for chunk_id, doc_id, chunk_index, content in rows:
+        digest = chunk_hash(content)
+        if digest in kept:
+            duplicates.append((chunk_id,))
+        else:
+            kept[digest] = chunk_id
+        refs.append((source_id, f"doc {doc_id}", chunk_index, kept[digest]))
+    cursor.executemany("DELETE FROM academic_chunks WHERE id = ?", duplicates)
+    cursor.executemany(
+        "UPDATE academic_chunks SET content_hash = ? WHERE id = ?", [(d, chunk_id) for d, chunk_id in kept.items()]
+    )
+    cursor.executemany(
+        "INSERT OR IGNORE INTO academic_chunk_refs (source_id, locator, position, chunk_id) VALUES (?, ?, ?, ?)",
+        refs
+    )
+
+# ✅ Leave Reporting Rollups
+def backfill_leave_rollups(cursor):
+    cursor.execute("""
+        INSERT INTO leave_daily_stats (day, status, requests, total_days)
+        SELECT start_date, status, COUNT(*), COALESCE(SUM(days), 0) FROM leave_requests GROUP BY start_date, status
+    """)
+    cursor.execute("""
+        INSERT INTO mentor_pending_counts (mentor_id, pending)
+        SELECT mentor_id, COUNT(*) FROM leave_requests WHERE status = 'pending' GROUP BY mentor_id
+    """)
+    cursor.execute("""
+        INSERT INTO student_approved_days (student_id, day, requests, total_days)
+        SELECT student_id, start_date, COUNT(*), COALESCE(SUM(days), 0) FROM leave_requests
+        WHERE status = 'approved' GROUP BY student_id, start_date
+    """)
+
+def backfill_template_metadata(cursor):
+    """Preprocess templates stored before upload-time preparation existed; unusable ones are left as they are."""
+    for template_type, file_path in cursor.execute("SELECT template_type, file_path FROM certificate_templates").fetchall():
+        try:
+            with open(file_path, "rb") as f:
+                template_data, metadata = prepare_template(f.read())
+        except (OSError, TemplateRejected):
+            continue
+        write_template_file(file_path, template_data)
+        save_template_record(cursor, template_type, file_path, metadata)
+
+# ✅ Schema Migrations
+# Each entry is (version, description, steps); a step is SQL or a callable taking a cursor.
+# Append new migrations at the end; never edit one that has already shipped.
+MIGRATIONS = [
+    (1, "leave_requests lookup indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_leave_requests_mentor_status ON leave_requests (mentor_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_leave_requests_student_start ON leave_requests (student_id, start_date)",
+    ]),
+    (2, "academic_docs chunk index with FTS5", [
+        """
+        CREATE TABLE IF NOT EXISTS academic_chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc_id INTEGER REFERENCES academic_docs (id),
+            chunk_index INTEGER,
+            content TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_academic_chunks_doc ON academic_chunks (doc_id)",
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS academic_chunks_fts USING fts5(
+            content, content='academic_chunks', content_rowid='id', tokenize='porter unicode61'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS academic_chunks_ai AFTER INSERT ON academic_chunks BEGIN
+            INSERT INTO academic_chunks_fts (rowid, content) VALUES (new.id, new.content);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS academic_chunks_ad AFTER DELETE ON academic_chunks BEGIN
+            INSERT INTO academic_chunks_fts (academic_chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+        """,
+        backfill_academic_chunks,
+    ]),
+    (3, "academic answer cache", [
+        """
+        CREATE TABLE IF NOT EXISTS academic_answer_cache (
+            key TEXT PRIMARY KEY,
+            query TEXT,
+            answer TEXT,
+            created_at REAL,
+            last_hit_at REAL,
+            hits INTEGER DEFAULT 0
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_academic_answer_cache_last_hit ON academic_answer_cache (last_hit_at)",
+    ]),
+    (4, "background jobs", [
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT,
+            status TEXT CHECK(status IN ('queued', 'running', 'done', 'failed')),
+            payload TEXT,
+            result TEXT,
+            error TEXT,
+            rows_done INTEGER DEFAULT 0,
+            pages_done INTEGER DEFAULT 0,
+            worker TEXT,
+            created_at REAL,
+            started_at REAL,
+            updated_at REAL,
+            heartbeat_at REAL,
+            finished_at REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)",
+    ]),
+    (5, "per-student/per-mentor leave change versions", [
+        """
+        CREATE TABLE IF NOT EXISTS leave_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS leave_requests_version_ai AFTER INSERT ON leave_requests BEGIN
+            INSERT INTO leave_versions (scope, version)
+            VALUES ('student:' || new.student_id, 1), ('mentor:' || new.mentor_id, 1)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS leave_requests_version_au AFTER UPDATE ON leave_requests BEGIN
+            INSERT INTO leave_versions (scope, version)
+            VALUES ('student:' || old.student_id, 1), ('mentor:' || old.mentor_id, 1),
+                   ('student:' || new.student_id, 1), ('mentor:' || new.mentor_id, 1)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS leave_requests_version_ad AFTER DELETE ON leave_requests BEGIN
+            INSERT INTO leave_versions (scope, version)
+            VALUES ('student:' || old.student_id, 1), ('mentor:' || old.mentor_id, 1)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1;
+        END
+        """,
+    ]),
+    (6, "leave timestamps and reporting rollups", [
+        "ALTER TABLE leave_requests ADD COLUMN created_at TEXT",
+        "ALTER TABLE leave_requests ADD COLUMN decided_at TEXT",
+        """
+        CREATE TABLE IF NOT EXISTS leave_daily_stats (
+            day TEXT,
+            status TEXT,
+            requests INTEGER NOT NULL DEFAULT 0,
+            total_days INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, status)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS mentor_pending_counts (
+            mentor_id TEXT PRIMARY KEY,
+            pending INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS student_approved_days (
+            student_id TEXT,
+            day TEXT,
+            requests INTEGER NOT NULL DEFAULT 0,
+            total_days INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (student_id, day)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_student_approved_days_day ON student_approved_days (day)",
+        """
+        CREATE TABLE IF NOT EXISTS mentor_decision_latency (
+            mentor_id TEXT,
+            day TEXT,
+            decisions INTEGER NOT NULL DEFAULT 0,
+            total_seconds REAL NOT NULL DEFAULT 0,
+            max_seconds REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (mentor_id, day)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_mentor_decision_latency_day ON mentor_decision_latency (day)",
+        backfill_leave_rollups,
+        """
+        CREATE TRIGGER IF NOT EXISTS leave_rollup_ai AFTER INSERT ON leave_requests BEGIN
+            INSERT INTO leave_daily_stats (day, status, requests, total_days)
+            VALUES (new.start_date, new.status, 1, new.days)
+            ON CONFLICT (day, status) DO UPDATE SET
+                requests = requests + 1, total_days = total_days + excluded.total_days;
+            INSERT INTO mentor_pending_counts (mentor_id, pending)
+            SELECT new.mentor_id, 1 WHERE new.status = 'pending'
+            ON CONFLICT (mentor_id) DO UPDATE SET pending = pending + 1;
+            INSERT INTO student_approved_days (student_id, day, requests, total_days)
+            SELECT new.student_id, new.start_date, 1, new.days WHERE new.status = 'approved'
+            ON CONFLICT (student_id, day) DO UPDATE SET
+                requests = requests + 1, total_days = total_days + excluded.total_days;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS leave_rollup_au AFTER UPDATE OF status, mentor_id ON leave_requests BEGIN
+            UPDATE leave_daily_stats SET requests = requests - 1, total_days = total_days - old.days
+            WHERE old.status != new.status AND day = old.start_date AND status = old.status;
+            INSERT INTO leave_daily_stats (day, status, requests, total_days)
+            SELECT new.start_date, new.status, 1, new.days WHERE old.status != new.status
+            ON CONFLICT (day, status) DO UPDATE SET
+                requests = requests + 1, total_days = total_days + excluded.total_days;
+
+            UPDATE mentor_pending_counts SET pending = pending - 1
+            WHERE old.status = 'pending' AND mentor_id = old.mentor_id;
+            INSERT INTO mentor_pending_counts (mentor_id, pending)
+            SELECT new.mentor_id, 1 WHERE new.status = 'pending'
+            ON CONFLICT (mentor_id) DO UPDATE SET pending = pending + 1;
+
+            UPDATE student_approved_days SET requests = requests - 1, total_days = total_days - old.days
+            WHERE old.status = 'approved' AND new.status != 'approved'
+                AND student_id = old.student_id AND day = old.start_date;
+            INSERT INTO student_approved_days (student_id, day, requests, total_days)
+            SELECT new.student_id, new.start_date, 1, new.days
+            WHERE new.status = 'approved' AND old.status != 'approved'
+            ON CONFLICT (student_id, day) DO UPDATE SET
+                requests = requests + 1, total_days = total_days + excluded.total_days;
+
+            INSERT INTO mentor_decision_latency (mentor_id, day, decisions, total_seconds, max_seconds)
+            SELECT new.mentor_id, date(new.decided_at), 1, latency, latency
+            FROM (SELECT (julianday(new.decided_at) - julianday(new.created_at)) * 86400 AS latency)
+            WHERE old.status = 'pending' AND new.status IN ('approved', 'rejected') AND latency IS NOT NULL
+            ON CONFLICT (mentor_id, day) DO UPDATE SET
+                decisions = decisions + 1,
+                total_seconds = total_seconds + excluded.total_seconds,
+                max_seconds = MAX(max_seconds, excluded.max_seconds);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS leave_rollup_ad AFTER DELETE ON leave_requests BEGIN
+            UPDATE leave_daily_stats SET requests = requests - 1, total_days = total_days - old.days
+            WHERE day = old.start_date AND status = old.status;
+            UPDATE mentor_pending_counts SET pending = pending - 1
+            WHERE old.status = 'pending' AND mentor_id = old.mentor_id;
+            UPDATE student_approved_days SET requests = requests - 1, total_days = total_days - old.days
+            WHERE old.status = 'approved' AND student_id = old.student_id AND day = old.start_date;
+        END
+        """,
+    ]),
+    (7, "certificate idempotency keys", [
+        """
+        CREATE TABLE IF NOT EXISTS certificate_requests (
+            idempotency_key TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            issue_date TEXT,
+            created_at REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_certificate_requests_created ON certificate_requests (created_at)",
+    ]),
+    (8, "preprocessed certificate templates", [
+        "ALTER TABLE certificate_templates ADD COLUMN page_width REAL",
+        "ALTER TABLE certificate_templates ADD COLUMN page_height REAL",
+        "ALTER TABLE certificate_templates ADD COLUMN page_rotation INTEGER",
+        "ALTER TABLE certificate_templates ADD COLUMN fonts INTEGER",
+        "ALTER TABLE certificate_templates ADD COLUMN images INTEGER",
+        "ALTER TABLE certificate_templates ADD COLUMN source_pages INTEGER",
+        "ALTER TABLE certificate_templates ADD COLUMN source_bytes INTEGER",
+        "ALTER TABLE certificate_templates ADD COLUMN template_bytes INTEGER",
+        "ALTER TABLE certificate_templates ADD COLUMN content_hash TEXT",
+        "ALTER TABLE certificate_templates ADD COLUMN prepared_at TEXT",
+        backfill_template_metadata,
+    ]),
+    (9, "declarative certificate layouts", [
+        """
+        CREATE TABLE IF NOT EXISTS certificate_layouts (
+            template_type TEXT PRIMARY KEY,
+            spec TEXT,
+            version TEXT,
+            updated_at TEXT
+        )
+        """,
+    ]),
+    (10, "content-hashed academic chunks with sources", [
+        """
+        CREATE TABLE IF NOT EXISTS academic_sources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            filename TEXT,
+            upload_id TEXT,
+            content_hash TEXT,
+            status TEXT CHECK(status IN ('loading', 'active')),
+            created_at TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_academic_sources_name ON academic_sources (name, status)",
+        """
+        CREATE TABLE IF NOT EXISTS academic_chunk_refs (
+            source_id INTEGER REFERENCES academic_sources (id),
+            locator TEXT,
+            position INTEGER,
+            chunk_id INTEGER REFERENCES academic_chunks (id),
+            PRIMARY KEY (source_id, locator, position)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_academic_chunk_refs_chunk ON academic_chunk_refs (chunk_id)",
+        "ALTER TABLE academic_chunks ADD COLUMN content_hash TEXT",
+        backfill_chunk_sources,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_academic_chunks_hash ON academic_chunks (content_hash)",
+    ]),
+    (11, "leave overlap index and idempotency keys", [
+        # Replaces the (student_id, start_date) index, which is its prefix
+        "CREATE INDEX IF NOT EXISTS idx_leave_requests_student_dates ON leave_requests (student_id, start_date, end_date)",
+        "DROP INDEX IF EXISTS idx_leave_requests_student_start",
+        """
+        CREATE TABLE IF NOT EXISTS leave_submissions (
+            idempotency_key TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            leave_id INTEGER,
+            message TEXT,
+            created_at REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_leave_submissions_created ON leave_submissions (created_at)",
+    ]),
+]
+
+
+def get_schema_version(cursor):
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+
+def apply_migrations(conn):
+    """Apply pending migrations in order, one transaction each. Returns the final schema version."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
     conn.commit()
-    conn.close()
 
-initialize_db()
+    for version, description, steps in MIGRATIONS:
+        # BEGIN IMMEDIATE serializes workers that start at the same time
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(cursor) >= version:
+                cursor.execute("ROLLBACK")
+                continue
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)", (version, description)
+            )
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+    return get_schema_version(cursor)
+
+
+def initialize_db():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    create_tables(cursor)
+    conn.commit()
+    apply_migrations(conn)
+    conn.close()
 
 # ✅ Assign Mentor API
+def iter_json_records(stream, block_size=64 * 1024):
+    """Yield records from a JSON array or JSON Lines text stream, reading it a block at a time."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+    in_array = None
+    while True:
+        buffer = buffer.lstrip()
+        if in_array is None and (buffer or eof):
+            in_array = buffer.startswith("[")
+            buffer = buffer[1:] if in_array else buffer
+            continue
+        if in_array and buffer.startswith(","):
+            buffer = buffer[1:]
+            continue
+        if in_array and buffer.startswith("]"):
+            return
+        if buffer:
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # Most likely a record cut off at the block boundary
+                if eof:
+                    raise
+            else:
+                yield record
+                buffer = buffer[end:]
+                continue
+        elif eof:
+            return
+        block = stream.read(block_size)
+        eof = not block
+        buffer += block
+
+
+def import_mentor_assignments(conn, records):
+    """Upsert {"student_id", "mentor_id"} records in IMMEDIATE transactions of MENTOR_IMPORT_CHUNK_ROWS.
+
+    Each chunk is loaded into a temp table with executemany, then merged into mentor_assignments and
+    applied to the chunk's pending leave_requests with one set-based statement each. Chunks commit
+    independently, so a failed import can simply be re-run. Returns the counts (plus "error" on bad input).
+    """
+    counts = dict.fromkeys(("rows", "inserted", "updated", "unchanged", "duplicates", "invalid", "leaves_reassigned"), 0)
+    errors = []
+    batch = {}
+    cursor = conn.cursor()
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS mentor_import (student_id TEXT PRIMARY KEY, mentor_id TEXT)")
+
+    def flush():
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("DELETE FROM mentor_import")
+            cursor.executemany("INSERT INTO mentor_import (student_id, mentor_id) VALUES (?, ?)", batch.items())
+            cursor.execute("""
+                SELECT
+                    COALESCE(SUM(a.student_id IS NULL), 0),
+                    COALESCE(SUM(a.student_id IS NOT NULL AND a.mentor_id IS NOT i.mentor_id), 0)
+                FROM mentor_import i
+                LEFT JOIN mentor_assignments a ON a.student_id = i.student_id
+            """)
+            inserted, updated = cursor.fetchone()
+            cursor.execute("""
+                INSERT INTO mentor_assignments (student_id, mentor_id)
+                SELECT student_id, mentor_id FROM mentor_import WHERE true
+                ON CONFLICT (student_id) DO UPDATE SET mentor_id = excluded.mentor_id
+                WHERE mentor_id IS NOT excluded.mentor_id
+            """)
+            # Also catches pending leaves still with a mentor from before an earlier reassignment
+            cursor.execute("""
+                UPDATE leave_requests SET mentor_id = i.mentor_id
+                FROM mentor_import i
+                WHERE leave_requests.student_id = i.student_id
+                    AND leave_requests.status = 'pending'
+                    AND leave_requests.mentor_id IS NOT i.mentor_id
+            """)
+            counts["leaves_reassigned"] += cursor.rowcount
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        counts["inserted"] += inserted
+        counts["updated"] += updated
+        counts["unchanged"] += len(batch) - inserted - updated
+        batch.clear()
+
+    try:
+        for record in records:
+            counts["rows"] += 1
+            student_id = mentor_id = None
+            if isinstance(record, dict):
+                student_id = str(record.get("student_id") or "").strip()
+                mentor_id = str(record.get("mentor_id") or "").strip()
+            if not student_id or not mentor_id:
+                counts["invalid"] += 1
+                if len(errors) < 20:
+                    errors.append({"row": counts["rows"], "message": "student_id and mentor_id are required."})
+                continue
+            if student_id in batch:
+                # The later row for a student wins
+                counts["duplicates"] += 1
+            batch[student_id] = mentor_id
+            if len(batch) >= MENTOR_IMPORT_CHUNK_ROWS:
+                flush()
+    except (ValueError, csv.Error) as e:
+        counts["error"] = f"Row {counts['rows'] + 1}: {e}"
+    if batch:
+        flush()
+    return {**counts, "errors": errors}
+
+
 @app.route("/assign-mentor", methods=["POST"])
 def assign_mentor():
     data = request.json
@@ -84,138 +1158,1101 @@ def assign_mentor():
     mentor_id = data["mentor_id"]
 
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR REPLACE INTO mentor_assignments (student_id, mentor_id) VALUES (?, ?)", (student_id, mentor_id))
-    conn.commit()
+    counts = import_mentor_assignments(conn, [{"student_id": student_id, "mentor_id": mentor_id}])
     conn.close()
+    if counts["invalid"]:
+        return jsonify({"message": "❌ student_id and mentor_id are required."}), 400
+
+    return jsonify({
+        "message": f"✅ Assigned Mentor {mentor_id} to Student {student_id}.",
+        "leaves_reassigned": counts["leaves_reassigned"],
+    })
+
+# ✅ Bulk Mentor Assignment Import (Admin)
+@app.route("/assign-mentors", methods=["POST"])
+def assign_mentors():
+    """Import mentor assignments from CSV (student_id,mentor_id header) or JSON (array or JSON Lines).
+
+    The body is either a multipart "file" upload or the raw CSV/JSON with a matching Content-Type;
+    either way it is parsed as a stream rather than loaded whole.
+    """
+    if "file" in request.files:
+        upload = request.files["file"]
+        stream = upload.stream
+        kind = "csv" if upload.filename.lower().endswith(".csv") else "json"
+    else:
+        stream = request.stream
+        kind = "csv" if request.mimetype in ("text/csv", "application/csv") else "json"
+
+    text = io.TextIOWrapper(stream if hasattr(stream, "read1") else io.BufferedReader(stream), encoding="utf-8-sig", newline="")
+    records = csv.DictReader(text) if kind == "csv" else iter_json_records(text)
 
-    return jsonify({"message": f"✅ Assigned Mentor {mentor_id} to Student {student_id}."})
+    conn = get_db_connection()
+    start = time.perf_counter()
+    try:
+        counts = import_mentor_assignments(conn, records)
+    finally:
+        text.detach()
+        conn.close()
+    elapsed = time.perf_counter() - start
+
+    body = {
+        **counts,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(counts["rows"] / elapsed, 1) if elapsed else None,
+    }
+    if "error" in counts:
+        # Chunks before the bad row are committed; re-running the fixed file is safe
+        return jsonify({"message": f"❌ Invalid {kind.upper()}: {counts['error']}", **body}), 400
+    return jsonify({"message": "✅ Mentor assignments imported.", **body})
+
+def utc_timestamp():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
 # ✅ Request Leave API (Auto-approve if ≤ 5 days)
+def submit_leave(conn, student_id, days, idempotency_key=None):
+    """Insert a leave starting today in one IMMEDIATE transaction. Returns (body, status code, replayed).
+
+    Concurrent submissions are serialized by the write lock, so the overlap check against the
+    student's pending/approved leaves (end dates are exclusive) cannot race with another insert.
+    A known idempotency_key replays the first response; reused with other values it is a 422.
+    """
+    fingerprint = hashlib.sha1(json.dumps([student_id, days]).encode()).hexdigest()
+    today = datetime.date.today()
+    start_date = today.strftime("%Y-%m-%d")
+    end_date = (today + datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        if idempotency_key:
+            now = time.time()
+            cursor.execute("DELETE FROM leave_submissions WHERE created_at < ?", (now - LEAVE_IDEMPOTENCY_TTL,))
+            cursor.execute(
+                "SELECT fingerprint, leave_id, message FROM leave_submissions WHERE idempotency_key = ?",
+                (idempotency_key,)
+            )
+            previous = cursor.fetchone()
+            if previous:
+                cursor.execute("COMMIT")
+                if previous["fingerprint"] != fingerprint:
+                    return {"message": "❌ Idempotency-Key was already used for a different leave request."}, 422, False
+                return {"message": previous["message"], "leave_id": previous["leave_id"]}, 200, True
+
+        cursor.execute("""
+            SELECT id, start_date, end_date, status FROM leave_requests
+            WHERE student_id = ? AND start_date < ? AND end_date > ? AND status IN ('pending', 'approved')
+            LIMIT 1
+        """, (student_id, end_date, start_date))
+        conflict = cursor.fetchone()
+        if conflict:
+            cursor.execute("COMMIT")
+            return {
+                "message": (
+                    f"❌ Leave overlaps your {conflict['status']} request #{conflict['id']} "
+                    f"({conflict['start_date']} to {conflict['end_date']})."
+                ),
+                "conflict": dict(conflict),
+            }, 409, False
+
+        if days <= 5:
+            status = "approved"
+            mentor_id = "Auto-Approved"
+        else:
+            cursor.execute("SELECT mentor_id FROM mentor_assignments WHERE student_id = ?", (student_id,))
+            mentor = cursor.fetchone()
+            if not mentor:
+                cursor.execute("COMMIT")
+                return {"message": "❌ No mentor found for this student."}, 400, False
+            status = "pending"
+            mentor_id = mentor["mentor_id"]
+
+        created_at = utc_timestamp()
+        decided_at = created_at if status == "approved" else None
+        cursor.execute("""
+            INSERT INTO leave_requests (student_id, mentor_id, days, start_date, end_date, status, created_at, decided_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (student_id, mentor_id, days, start_date, end_date, status, created_at, decided_at))
+        leave_id = cursor.lastrowid
+        message = f"✅ Leave request for {days} days sent to {mentor_id}. Status: {status}."
+
+        if idempotency_key:
+            cursor.execute(
+                "INSERT INTO leave_submissions (idempotency_key, fingerprint, leave_id, message, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (idempotency_key, fingerprint, leave_id, message, now)
+            )
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return {"message": message, "leave_id": leave_id}, 200, False
+
+
 @app.route("/leave", methods=["POST"])
 def process_leave():
     data = request.json
-    student_id = data["student_id"]
-    days = data["days"]
-    start_date = datetime.date.today().strftime("%Y-%m-%d")
-    end_date = (datetime.date.today() + datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+    days = data.get("days")
+    # type() rather than isinstance(): JSON true/false must not pass as 1/0 days
+    if type(days) is not int or days < 1:
+        return jsonify({"message": "❌ days must be a positive whole number."}), 400
 
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT mentor_id FROM mentor_assignments WHERE student_id = ?", (student_id,))
-    mentor = cursor.fetchone()
-
-    if days <= 5:
-        status = "approved"
-        mentor_id = "Auto-Approved"
-    elif mentor:
-        status = "pending"
-        mentor_id = mentor["mentor_id"]
-    else:
+    try:
+        body, status_code, replayed = submit_leave(
+            conn, data["student_id"], days, request.headers.get("Idempotency-Key")
+        )
+    finally:
         conn.close()
-        return jsonify({"message": "❌ No mentor found for this student."}), 400
 
-    cursor.execute("""
-        INSERT INTO leave_requests (student_id, mentor_id, days, start_date, end_date, status)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (student_id, mentor_id, days, start_date, end_date, status))
+    response = jsonify(body)
+    response.status_code = status_code
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response
 
-    conn.commit()
-    conn.close()
+# ✅ Paginated Leave Listings
+def leave_list_response(scope, columns, filters, params, default_status=None):
+    """Keyset-paginated leave listing (cursor on id) with an ETag tied to the scope's change version.
 
-    return jsonify({"message": f"✅ Leave request for {days} days sent to {mentor_id}. Status: {status}."})
+    Query args: cursor, limit, status ("all" disables the default), from/to (start_date range).
+    """
+    args = request.args
+    try:
+        limit = max(1, min(int(args.get("limit", LEAVE_PAGE_SIZE)), LEAVE_PAGE_MAX))
+        cursor_id = int(args.get("cursor", 0))
+    except ValueError:
+        return jsonify({"message": "❌ cursor and limit must be integers."}), 400
+
+    status = args.get("status", default_status)
+    if status and status != "all":
+        filters.append("status = ?")
+        params.append(status)
+    if args.get("from"):
+        filters.append("start_date >= ?")
+        params.append(args["from"])
+    if args.get("to"):
+        filters.append("start_date <= ?")
+        params.append(args["to"])
+    filters.append("id > ?")
+    params.append(cursor_id)
+
+    conn = get_db_connection()
+    # One read snapshot, so the version and the rows agree
+    conn.execute("BEGIN")
+    row = conn.execute("SELECT version FROM leave_versions WHERE scope = ?", (scope,)).fetchone()
+    version = row["version"] if row else 0
+    etag = hashlib.sha1(f"{scope}|{version}|{sorted(args.items(multi=True))}".encode()).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        conn.rollback()
+        conn.close()
+        response = Response(status=304)
+    else:
+        rows = conn.execute(
+            f"SELECT {columns} FROM leave_requests WHERE {' AND '.join(filters)} ORDER BY id LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        conn.rollback()
+        conn.close()
+        response = jsonify({
+            "requests": [dict(req) for req in rows[:limit]],
+            "next_cursor": rows[limit - 1]["id"] if len(rows) > limit else None,
+        })
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 # ✅ Fetch Student Leave Requests
 @app.route("/student-leave-status", methods=["GET"])
 def student_leave_status():
     student_id = request.args.get("student_id")
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT mentor_id, days, start_date, end_date, status FROM leave_requests WHERE student_id = ?", (student_id,))
-    requests = cursor.fetchall()
-    conn.close()
-
-    return jsonify({"requests": [dict(req) for req in requests]})
+    return leave_list_response(
+        f"student:{student_id}", "id, mentor_id, days, start_date, end_date, status",
+        ["student_id = ?"], [student_id]
+    )
 
 # ✅ Fetch Mentor Leave Requests
 @app.route("/mentor-leave-requests", methods=["GET"])
 def mentor_leave_requests():
     mentor_id = request.args.get("mentor_id")
+    return leave_list_response(
+        f"mentor:{mentor_id}", "id, student_id, days, start_date, end_date, status",
+        ["mentor_id = ?"], [mentor_id], default_status="pending"
+    )
 
-    conn = get_db_connection()
+# ✅ Leave Decisions
+LEAVE_DECISIONS = {"approve": "approved", "approved": "approved", "reject": "rejected", "rejected": "rejected"}
+
+
+def apply_leave_decisions(conn, decisions, mentor_id=None):
+    """Apply [(leave_id, status)] in one transaction. Only pending requests can change.
+
+    If mentor_id is given, requests assigned to another mentor are refused.
+    Returns one {"leave_id", "status", "result"} dict per decision, in order.
+    """
     cursor = conn.cursor()
-    cursor.execute("SELECT id, student_id, days, start_date, end_date, status FROM leave_requests WHERE mentor_id = ? AND status = 'pending'", (mentor_id,))
-    requests = cursor.fetchall()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        ids = list({leave_id for leave_id, _ in decisions})
+        current = {}
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            cursor.execute(
+                f"SELECT id, mentor_id, status FROM leave_requests WHERE id IN ({','.join('?' * len(batch))})", batch
+            )
+            current.update({row["id"]: row for row in cursor.fetchall()})
+
+        results = []
+        updates = []
+        seen = set()
+        for leave_id, status in decisions:
+            row = current.get(leave_id)
+            if row is None:
+                result = "not_found"
+            elif mentor_id is not None and row["mentor_id"] != mentor_id:
+                result = "forbidden"
+            elif leave_id in seen or row["status"] != "pending":
+                result = "not_pending"
+            else:
+                result = status
+                updates.append((status, leave_id))
+            seen.add(leave_id)
+            results.append({"leave_id": leave_id, "status": status, "result": result})
+
+        decided_at = utc_timestamp()
+        cursor.executemany(
+            "UPDATE leave_requests SET status = ?, decided_at = ? WHERE id = ? AND status = 'pending'",
+            [(status, decided_at, leave_id) for status, leave_id in updates]
+        )
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return results
+
+
+def single_leave_decision(leave_id, status, message):
+    conn = get_db_connection()
+    result = apply_leave_decisions(conn, [(leave_id, status)])[0]["result"]
     conn.close()
 
-    return jsonify({"requests": [dict(req) for req in requests]})
+    if result == "not_found":
+        return jsonify({"message": "❌ Leave request not found."}), 404
+    if result == "not_pending":
+        return jsonify({"message": "❌ Leave request is no longer pending."}), 409
+    return jsonify({"message": message})
 
 # ✅ Approve Leave (Mentor Action)
 @app.route("/approve-leave", methods=["POST"])
 def approve_leave():
     data = request.json
     leave_id = data["leave_id"]
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE leave_requests SET status = 'approved' WHERE id = ?", (leave_id,))
-    conn.commit()
-    conn.close()
-
-    return jsonify({"message": "✅ Leave request approved."})
+    return single_leave_decision(leave_id, "approved", "✅ Leave request approved.")
 
 # ✅ Reject Leave (Mentor Action)
 @app.route("/reject-leave", methods=["POST"])
 def reject_leave():
     data = request.json
     leave_id = data["leave_id"]
+    return single_leave_decision(leave_id, "rejected", "❌ Leave request rejected.")
+
+# ✅ Batch Leave Decisions (Mentor Action)
+@app.route("/leave/decisions", methods=["POST"])
+def leave_decisions():
+    data = request.json or {}
+    if not isinstance(data, dict) or not isinstance(data.get("decisions", []), list):
+        return jsonify({"message": "❌ Expected an object with a list of decisions."}), 400
+    items = data.get("decisions", [])
+    mentor_id = data.get("mentor_id")
+
+    if not items:
+        return jsonify({"message": "❌ No decisions provided."}), 400
+
+    decisions = []
+    for item in items:
+        # type() rather than isinstance(): JSON true/false must not pass as leave IDs 1/0
+        if not isinstance(item, dict) or type(item.get("leave_id")) is not int:
+            return jsonify({"message": f"❌ Invalid decision: {item}"}), 400
+        status = LEAVE_DECISIONS.get(str(item.get("decision", "")).lower())
+        if status is None:
+            return jsonify({"message": f"❌ Invalid decision: {item}"}), 400
+        decisions.append((item["leave_id"], status))
 
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE leave_requests SET status = 'rejected' WHERE id = ?", (leave_id,))
-    conn.commit()
+    results = apply_leave_decisions(conn, decisions, mentor_id)
     conn.close()
 
-    return jsonify({"message": "❌ Leave request rejected."})
+    applied = sum(1 for r in results if r["result"] == r["status"])
+    return jsonify({
+        "message": f"✅ Applied {applied} of {len(results)} decisions.",
+        "applied": applied,
+        "results": results,
+    })
+
+# ✅ Leave Report API (Admin)
+# Each report reads a rollup table, so cost grows with the number of groups, not leave requests.
+# Reports marked True take the (from, to) period as parameters.
+LEAVE_REPORTS = {
+    "mentor_pending": ("""
+        SELECT mentor_id, pending FROM mentor_pending_counts WHERE pending > 0 ORDER BY pending DESC
+    """, False),
+    "student_days": ("""
+        SELECT student_id, SUM(requests) AS requests, SUM(total_days) AS total_days
+        FROM student_approved_days WHERE day BETWEEN ? AND ?
+        GROUP BY student_id ORDER BY total_days DESC
+    """, True),
+    "approval_latency": ("""
+        SELECT mentor_id, SUM(decisions) AS decisions,
+               ROUND(SUM(total_seconds) / SUM(decisions), 1) AS avg_seconds,
+               ROUND(MAX(max_seconds), 1) AS max_seconds
+        FROM mentor_decision_latency WHERE day BETWEEN ? AND ?
+        GROUP BY mentor_id ORDER BY avg_seconds DESC
+    """, True),
+    "daily_volume": ("""
+        SELECT day, status, requests, total_days
+        FROM leave_daily_stats WHERE day BETWEEN ? AND ? AND requests > 0 ORDER BY day, status
+    """, True),
+}
+
+
+def run_leave_report(conn, name, period):
+    sql, uses_period = LEAVE_REPORTS[name]
+    return conn.execute(sql, period if uses_period else ())
+
+
+def stream_report_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([col[0] for col in cursor.description])
+    while True:
+        rows = cursor.fetchmany(REPORT_EXPORT_BATCH)
+        if not rows:
+            break
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_report_parquet(cursor):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = [col[0] for col in cursor.description]
+    sink = StreamSink()
+    writer = None
+    while True:
+        rows = cursor.fetchmany(REPORT_EXPORT_BATCH)
+        if not rows and writer is not None:
+            break
+        # Each batch becomes one row group, so only one batch is held in memory
+        table = pa.Table.from_pylist(
+            [dict(zip(columns, row)) for row in rows],
+            schema=writer.schema if writer else None
+        ) if rows else pa.table({name: pa.array([], pa.string()) for name in columns})
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+        if not rows:
+            break
+    writer.close()
+    yield sink.drain()
+
+
+@app.route("/admin/leave-report", methods=["GET"])
+def leave_report():
+    today = datetime.date.today()
+    period = (
+        request.args.get("from", (today - datetime.timedelta(days=30)).isoformat()),
+        request.args.get("to", today.isoformat()),
+    )
+    output_format = request.args.get("format", "json")
+
+    if output_format == "json":
+        try:
+            limit = max(1, min(int(request.args.get("limit", 100)), 10000))
+        except ValueError:
+            return jsonify({"message": "❌ limit must be an integer."}), 400
+        conn = get_db_connection()
+        report = {
+            name: [dict(row) for row in run_leave_report(conn, name, period).fetchmany(limit)]
+            for name in LEAVE_REPORTS
+        }
+        conn.close()
+        return jsonify({"from": period[0], "to": period[1], **report})
+
+    name = request.args.get("report")
+    if name not in LEAVE_REPORTS:
+        return jsonify({"message": f"❌ Choose a report to export: {', '.join(LEAVE_REPORTS)}"}), 400
+    if output_format == "csv":
+        stream, mimetype = stream_report_csv, "text/csv"
+    elif output_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return jsonify({"message": "❌ Parquet export requires pyarrow."}), 400
+        stream, mimetype = stream_report_parquet, "application/vnd.apache.parquet"
+    else:
+        return jsonify({"message": "❌ Invalid format. Supported formats: json, csv, parquet"}), 400
+
+    conn = get_db_connection()
+    rows = stream(run_leave_report(conn, name, period))
+    return Response(
+        stream_with_context(rows),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={name}_{period[0]}_{period[1]}.{output_format}"}
+    )
+
+# ✅ Bulk Ingestion
+UPLOAD_FORMATS = (".csv", ".xlsx", ".json", ".pdf")
+
+
+def iter_table_chunks(filename, file):
+    """Yield DataFrames of at most UPLOAD_CHUNK_ROWS rows from a CSV or XLSX upload."""
+    if filename.endswith(".csv"):
+        import pandas as pd
+
+        yield from pd.read_csv(file, chunksize=UPLOAD_CHUNK_ROWS)
+    else:
+        import pandas as pd
+
+        # read_excel has no chunksize, so slice the parsed sheet instead
+        df = pd.read_excel(file)
+        for start in range(0, len(df), UPLOAD_CHUNK_ROWS):
+            yield df.iloc[start:start + UPLOAD_CHUNK_ROWS]
+
+
+def ingest_upload(conn, filename, file, progress=None, source=None, upload_id=None):
+    """Load an uploaded CSV/XLSX/JSON/PDF into the academic corpus as source `source` (default: filename).
+
+    Re-uploading identical content under the same source is skipped. Changed content replaces the
+    previous version incrementally: unchanged chunks are kept, new ones stored and orphaned ones removed.
+    progress, if given, is called as progress(rows_done, pages_done) after each chunk or page.
+    Returns {"source", "rows", "pages", "chunks", "new_chunks", "removed_chunks", "skipped"}.
+    """
+    source = source or filename
+    digest = hashlib.sha256()
+    for block in iter(lambda: file.read(1 << 20), b""):
+        digest.update(block)
+    file.seek(0)
+
+    counts = {"source": source, "rows": 0, "pages": 0, "chunks": 0, "new_chunks": 0, "removed_chunks": 0}
+    source_id = start_source(conn, source, filename, upload_id, digest.hexdigest())
+    if source_id is None:
+        return {**counts, "skipped": True}
+
+    def store(documents):
+        chunks, new_chunks = store_documents(conn, source_id, documents)
+        counts["chunks"] += chunks
+        counts["new_chunks"] += new_chunks
+
+    try:
+        if filename.endswith((".csv", ".xlsx")):
+            for chunk in iter_table_chunks(filename, file):
+                # One JSON document per row, serialized by pandas in a single pass
+                records = chunk.to_json(orient="records", lines=True, force_ascii=False).splitlines()
+                store([(f"row {counts['rows'] + i + 1}", record) for i, record in enumerate(records)])
+                counts["rows"] += len(records)
+                if progress:
+                    progress(counts["rows"], counts["pages"])
+
+        elif filename.endswith(".json"):
+            data = json.load(file)
+            store([("", json.dumps(data))])
+            counts["rows"] += 1
+
+        elif filename.endswith(".pdf"):
+            import PyPDF2
+
+            reader = PyPDF2.PdfReader(file)
+            for page in reader.pages:
+                with span("pdf.parse"):
+                    text = page.extract_text()
+                counts["pages"] += 1
+                if text:
+                    store([(f"page {counts['pages']}", text)])
+                if progress:
+                    progress(counts["rows"], counts["pages"])
+
+        counts["removed_chunks"] = finish_source(conn, source_id, source)
+    except Exception:
+        # Leave the previous version live and drop whatever this upload stored
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        drop_sources(cursor, [source_id])
+        cursor.execute("COMMIT")
+        raise
+
+    if counts["new_chunks"] or counts["removed_chunks"]:
+        # The corpus changed, so cached answers may be stale
+        cursor = conn.cursor()
+        answer_cache.invalidate(cursor)
+        conn.commit()
+    return {**counts, "skipped": False}
 
 # ✅ Upload AI Training Data (Admin)
+# PUT /academic-sources/<name> is the same upload, replacing that source by name.
 @app.route("/upload-data", methods=["POST"])
-def upload_ai_data():
+@app.route("/academic-sources/<path:name>", methods=["PUT"])
+def upload_ai_data(name=None):
     if "file" not in request.files:
         return jsonify({"message": "❌ No file uploaded."}), 400
 
     file = request.files["file"]
     filename = file.filename
+    source = name or request.form.get("source") or filename
+
+    if not filename.endswith(UPLOAD_FORMATS):
+        return jsonify({"message": "❌ Invalid file format. Supported formats: CSV, XLSX, JSON, PDF"}), 400
+
+    # By default the file is handed to a background job and the job ID is returned immediately
+    if request.form.get("sync", "").lower() not in ("1", "true", "yes"):
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=JOBS_DIR, suffix=os.path.splitext(filename)[1])
+        with os.fdopen(fd, "wb") as f:
+            file.save(f)
+        job_id = enqueue_job("upload", {"path": path, "filename": filename, "source": source})
+        return jsonify({"message": "⏳ Upload queued for processing.", "job_id": job_id}), 202
+
+    conn = get_db_connection()
+
+    try:
+        start = time.perf_counter()
+        counts = ingest_upload(conn, filename, file, source=source, upload_id=uuid.uuid4().hex)
+        elapsed = time.perf_counter() - start
+        conn.close()
+
+        if counts["skipped"]:
+            return jsonify({"message": "✅ Source already up to date; nothing to upload.", **counts})
+        return jsonify({
+            "message": "✅ AI Training Data Uploaded Successfully.",
+            **counts,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(counts["rows"] / elapsed, 1) if elapsed else None,
+        })
+
+    except SourceConflict as e:
+        conn.close()
+        return jsonify({"message": f"❌ {e}"}), 409
+    except Exception as e:
+        return jsonify({"message": f"❌ Error processing file: {str(e)}"}), 500
 
+# ✅ Academic Sources (Admin)
+@app.route("/academic-sources", methods=["GET"])
+def list_academic_sources():
+    conn = get_db_connection()
+    sources = conn.execute("""
+        SELECT s.name, s.filename, s.upload_id, s.status, s.created_at, COUNT(r.chunk_id) AS chunks
+        FROM academic_sources s
+        LEFT JOIN academic_chunk_refs r ON r.source_id = s.id
+        GROUP BY s.id
+        ORDER BY s.name, s.id
+    """).fetchall()
+    unique_chunks = conn.execute("SELECT COUNT(*) FROM academic_chunks").fetchone()[0]
+    conn.close()
+    return jsonify({"sources": [dict(row) for row in sources], "unique_chunks": unique_chunks})
+
+
+@app.route("/academic-sources/<path:name>", methods=["DELETE"])
+def delete_academic_source(name):
     conn = get_db_connection()
     cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("SELECT id FROM academic_sources WHERE name = ?", (name,))
+        source_ids = [row[0] for row in cursor.fetchall()]
+        if not source_ids:
+            cursor.execute("ROLLBACK")
+            return jsonify({"message": "❌ Source not found."}), 404
+        removed = drop_sources(cursor, source_ids)
+        answer_cache.invalidate(cursor)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return jsonify({"message": "✅ Source deleted.", "source": name, "removed_chunks": removed})
+
+# ✅ Background Jobs
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """Register fn(job_id, payload) -> result dict as the handler for jobs of this kind."""
+    def register(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue_job(kind, payload):
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    conn = get_db_connection()
+    conn.execute(
+        "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+        (job_id, kind, json.dumps(payload), now, now)
+    )
+    conn.commit()
+    conn.close()
+    return job_id
+
 
+def update_job(job_id, **fields):
+    fields["updated_at"] = fields["heartbeat_at"] = time.time()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    conn = get_db_connection()
+    conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+    conn.commit()
+    conn.close()
+
+
+def job_to_dict(row):
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"]) if job["payload"] else None
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    elapsed = None
+    if job["started_at"]:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+    job["elapsed_seconds"] = round(elapsed, 3) if elapsed else None
+    job["rows_per_sec"] = round(job["rows_done"] / elapsed, 1) if elapsed else None
+    return job
+
+
+def claim_job(worker_name):
+    """Atomically move the oldest queued job to running and return it, or None."""
+    now = time.time()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # SELECT + guarded UPDATE under the write lock (UPDATE ... RETURNING needs SQLite 3.35)
+    cursor.execute("BEGIN IMMEDIATE")
     try:
-        if filename.endswith(".csv") or filename.endswith(".xlsx"):
-            df = pd.read_csv(file) if filename.endswith(".csv") else pd.read_excel(file)
-            for _, row in df.iterrows():
-                cursor.execute("INSERT INTO academic_docs (content) VALUES (?)", (json.dumps(row.to_dict()),))
-            conn.commit()
+        cursor.execute("SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1")
+        job = cursor.fetchone()
+        if job is not None:
+            cursor.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, updated_at = ?, heartbeat_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (worker_name, now, now, now, job["id"])
+            )
+            if cursor.rowcount != 1:
+                job = None
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return job
 
-        elif filename.endswith(".json"):
-            data = json.load(file)
-            cursor.execute("INSERT INTO academic_docs (content) VALUES (?)", (json.dumps(data),))
-            conn.commit()
 
-        elif filename.endswith(".pdf"):
-            reader = PyPDF2.PdfReader(file)
-            text = "\n".join([page.extract_text() for page in reader.pages if page.extract_text()])
-            cursor.execute("INSERT INTO academic_docs (content) VALUES (?)", (text,))
+def requeue_stale_jobs():
+    """Put running jobs whose worker stopped heartbeating back on the queue."""
+    conn = get_db_connection()
+    cursor = conn.execute(
+        "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat_at < ?",
+        (time.time() - JOB_STALE_SECONDS,)
+    )
+    conn.commit()
+    conn.close()
+    return cursor.rowcount
+
+
+def heartbeat_job(job_id, stop):
+    """Keep a running job's heartbeat fresh until stop is set, so long steps without progress aren't requeued."""
+    while not stop.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            conn = get_db_connection()
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
             conn.commit()
-        else:
-            return jsonify({"message": "❌ Invalid file format. Supported formats: CSV, XLSX, JSON, PDF"}), 400
+            conn.close()
+        except sqlite3.Error:
+            app.logger.exception("Could not heartbeat job %s", job_id)
 
-        conn.close()
-        return jsonify({"message": "✅ AI Training Data Uploaded Successfully."})
 
+def run_job(job):
+    handler = JOB_HANDLERS.get(job["kind"])
+    stop = threading.Event()
+    threading.Thread(target=heartbeat_job, args=(job["id"], stop), name=f"job-heartbeat-{job['id']}", daemon=True).start()
+    try:
+        if handler is None:
+            raise ValueError(f"No handler for job kind {job['kind']!r}")
+        result = handler(job["id"], json.loads(job["payload"]))
+        update_job(job["id"], status="done", result=json.dumps(result), finished_at=time.time())
     except Exception as e:
-        return jsonify({"message": f"❌ Error processing file: {str(e)}"}), 500
+        update_job(job["id"], status="failed", error=str(e), finished_at=time.time())
+    finally:
+        stop.set()
+
+
+class JobWorkers:
+    """Threads that claim and run queued jobs, either inside the web process or standalone."""
+
+    def __init__(self, count, poll_interval):
+        self.count = count
+        self.poll_interval = poll_interval
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def start(self):
+        # Idempotent per process, so it is safe to call on every request
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        self._sweep()
+        for i in range(self.count):
+            name = f"{socket.gethostname()}:{os.getpid()}:{i}"
+            threading.Thread(target=self._loop, args=(name,), name=f"job-worker-{i}", daemon=True).start()
+
+    def run_forever(self):
+        self.start()
+        while True:
+            time.sleep(3600)
+
+    def _sweep(self):
+        """Requeue stale jobs at most once per JOB_STALE_SECONDS across this process's worker threads."""
+        now = time.monotonic()
+        with self._lock:
+            if self._last_sweep and now - self._last_sweep < JOB_STALE_SECONDS:
+                return
+            self._last_sweep = now
+        try:
+            requeue_stale_jobs()
+        except sqlite3.Error:
+            app.logger.exception("Could not requeue stale jobs")
+
+    def _loop(self, name):
+        while True:
+            # Every process keeps sweeping, so a job whose worker died is requeued even if no process restarts later
+            self._sweep()
+            try:
+                job = claim_job(name)
+            except sqlite3.Error:
+                app.logger.exception("Job worker %s could not claim a job", name)
+                job = None
+            if job is None:
+                time.sleep(self.poll_interval)
+                continue
+            run_job(job)
+
+
+job_workers = JobWorkers(JOB_WORKERS, JOB_POLL_INTERVAL)
+
+
+@app.before_request
+def start_job_workers():
+    if JOB_WORKER_MODE == "inprocess":
+        job_workers.start()
+
+
+@job_handler("upload")
+def run_upload_job(job_id, payload):
+    def progress(rows, pages):
+        update_job(job_id, rows_done=rows, pages_done=pages)
+
+    conn = get_db_connection()
+    try:
+        with open(payload["path"], "rb") as f:
+            counts = ingest_upload(conn, payload["filename"], f, progress, payload.get("source"), job_id)
+    finally:
+        conn.close()
+        os.remove(payload["path"])
+    update_job(job_id, rows_done=counts["rows"], pages_done=counts["pages"])
+    return counts
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    conn = get_db_connection()
+    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+
+    if not row:
+        return jsonify({"message": "❌ Job not found."}), 404
+    return jsonify(job_to_dict(row))
+
+
+@app.route("/jobs", methods=["GET"])
+def list_jobs():
+    status = request.args.get("status")
+    try:
+        limit = max(1, min(int(request.args.get("limit", 50)), 500))
+    except ValueError:
+        return jsonify({"message": "❌ limit must be an integer."}), 400
+
+    conn = get_db_connection()
+    if status:
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+        ).fetchall()
+    else:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    conn.close()
+
+    return jsonify({"jobs": [job_to_dict(row) for row in rows]})
+
+# ✅ Academic Answer Cache
+class AnswerCache:
+    """Persistent cache of LLM answers keyed on the normalized query and the retrieved context."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query):
+        return " ".join(re.findall(r"\w+", query.lower()))
+
+    def key(self, query, context):
+        context_hash = hashlib.sha256(context.encode()).hexdigest()
+        return hashlib.sha256(f"{self.normalize(query)}\0{context_hash}".encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT answer, created_at FROM academic_answer_cache WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        if row and now - row["created_at"] > self.ttl:
+            cursor.execute("DELETE FROM academic_answer_cache WHERE key = ?", (key,))
+            row = None
+        elif row:
+            cursor.execute(
+                "UPDATE academic_answer_cache SET last_hit_at = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+        conn.commit()
+        conn.close()
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row["answer"] if row else None
+
+    def put(self, key, query, answer):
+        now = time.time()
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR REPLACE INTO academic_answer_cache (key, query, answer, created_at, last_hit_at, hits)
+            VALUES (?, ?, ?, ?, ?, 0)
+        """, (key, self.normalize(query), answer, now, now))
+        # Evict expired entries, then least recently used ones beyond the size cap
+        cursor.execute("DELETE FROM academic_answer_cache WHERE created_at < ?", (now - self.ttl,))
+        cursor.execute("""
+            DELETE FROM academic_answer_cache WHERE key IN (
+                SELECT key FROM academic_answer_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        conn.commit()
+        conn.close()
+
+    def invalidate(self, cursor):
+        cursor.execute("DELETE FROM academic_answer_cache")
+
+    def stats(self):
+        conn = get_db_connection()
+        entries = conn.execute("SELECT COUNT(*) FROM academic_answer_cache").fetchone()[0]
+        conn.close()
+        with self._lock:
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+answer_cache = AnswerCache(ACADEMIC_CACHE_TTL, ACADEMIC_CACHE_MAX_ENTRIES)
+
+
+@app.route("/academic-cache-stats", methods=["GET"])
+def academic_cache_stats():
+    return jsonify(answer_cache.stats())
+
+# ✅ LLM Executor
+class LLMSaturated(Exception):
+    """Raised when every LLM slot and queue position is taken."""
+
+
+def is_retryable(error):
+    """Transient LLM failures: timeouts, connection errors, 429 and 5xx. Auth or bad-request errors won't improve."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    # groq.APITimeoutError is a subclass of APIConnectionError; matched by name so groq stays lazily imported
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+
+class LLMExecutor:
+    """Bounded thread pool for LLM calls with a fixed-size wait queue, timeouts and retries."""
+
+    def __init__(self, max_concurrency, queue_size, timeout, retries, backoff):
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        # Running + queued calls; once exhausted new calls are rejected instead of piling up
+        self._slots = threading.BoundedSemaphore(max_concurrency + queue_size)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.failed = 0
+
+    def submit(self, fn, *args, retry=True, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise LLMSaturated()
+        with self._lock:
+            self.submitted += 1
+            self.pending += 1
+        future = self._pool.submit(self._run, fn, args, kwargs, self.retries if retry else 0)
+        future.add_done_callback(self._release)
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn on the pool and wait for it; raises LLMSaturated or FutureTimeout."""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def _run(self, fn, args, kwargs, retries):
+        for attempt in range(retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == retries or not is_retryable(e):
+                    with self._lock:
+                        self.failed += 1
+                    raise
+                with self._lock:
+                    self.retried += 1
+                time.sleep(self.backoff * (2 ** attempt))
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "queue_size": self.queue_size,
+                "pending": self.pending,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "retried": self.retried,
+                "timeouts": self.timeouts,
+                "failed": self.failed,
+            }
+
+
+def get_llm_client():
+    """Groq client, created on first use so processes that never call the LLM skip the SDK import."""
+    global client
+    if client is None:
+        with client_lock:
+            if client is None:
+                from groq import Groq
+
+                # LLM_RETRIES (in LLMExecutor) is the only retry policy; the SDK's own retries are off
+                client = Groq(api_key=GROQ_API_KEY, max_retries=0)
+    return client
+
+
+llm_executor = LLMExecutor(LLM_MAX_CONCURRENCY, LLM_QUEUE_SIZE, LLM_TIMEOUT, LLM_RETRIES, LLM_RETRY_BACKOFF)
+
+
+def llm_busy_response():
+    return (
+        jsonify({"response": "❌ AI service is busy. Please try again shortly."}),
+        429,
+        {"Retry-After": str(LLM_RETRY_AFTER)},
+    )
+
+
+@app.route("/llm-stats", methods=["GET"])
+def llm_stats():
+    return jsonify(llm_executor.stats())
+
+# ✅ AI Academic Answer Streaming
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def start_llm_stream(messages):
+    """Start a streaming completion on the LLM executor and return its queue of (kind, value) events."""
+    events = queue.Queue()
+
+    def pump():
+        try:
+            stream = get_llm_client().chat.completions.create(
+                messages=messages, model=ACADEMIC_MODEL, stream=True, timeout=LLM_TIMEOUT
+            )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    events.put(("token", delta))
+            events.put(("done", None))
+        except Exception as e:
+            events.put(("error", str(e)))
+
+    # Tokens may already have reached the client, so a failed stream is never retried
+    llm_executor.submit(pump, retry=False)
+    return events
+
+
+def stream_academic_answer(events, query, cache_key):
+    """Yield SSE events: {"token": ...} per delta, then {"done": true} or {"error": ...}."""
+    parts = []
+    while True:
+        try:
+            kind, value = events.get(timeout=LLM_TIMEOUT)
+        except queue.Empty:
+            yield sse_event({"error": "❌ AI Error: request timed out."})
+            return
+        if kind == "token":
+            parts.append(value)
+            yield sse_event({"token": value})
+        elif kind == "error":
+            yield sse_event({"error": f"❌ AI Error: {value}"})
+            return
+        else:
+            break
+
+    answer_cache.put(cache_key, query, "".join(parts))
+    yield sse_event({"done": True})
+
+
+def stream_cached_answer(answer):
+    yield sse_event({"token": answer})
+    yield sse_event({"done": True, "cached": True})
 
 # ✅ AI Academic Query Processing (Groq SDK)
 @app.route("/academic", methods=["POST"])
@@ -226,33 +2263,543 @@ def academic_query():
 
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT content FROM academic_docs")
-    documents = cursor.fetchall()
+    knowledge_base = retrieve_context(cursor, query)
     conn.close()
 
-    if not documents:
+    if not knowledge_base:
         return jsonify({"response": "❌ No academic data available. Please upload training data."})
 
-    knowledge_base = " ".join([doc[0] for doc in documents])[:4000]
+    cache_key = answer_cache.key(query, knowledge_base)
+    cached_response = answer_cache.get(cache_key)
+    messages = [
+        {"role": "system", "content": "You are a helpful academic assistant."},
+        {"role": "user", "content": f"{query}\n\nContext:\n{knowledge_base}"}
+    ]
+
+    # Streaming mode: forward tokens as server-sent events while the model produces them
+    if data.get("stream") or request.accept_mimetypes.best == "text/event-stream":
+        if cached_response is not None:
+            events = stream_cached_answer(cached_response)
+        else:
+            try:
+                events = stream_academic_answer(start_llm_stream(messages), query, cache_key)
+            except LLMSaturated:
+                return llm_busy_response()
+        return Response(
+            stream_with_context(events),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    if cached_response is not None:
+        return jsonify({"response": cached_response, "cached": True})
 
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are a helpful academic assistant."},
-                {"role": "user", "content": f"{query}\n\nContext:\n{knowledge_base}"}
-            ],
-            model="llama-3.3-70b-versatile",
-        )
+        # Runs on the bounded LLM pool so a burst of questions can't take every worker thread
+        with span("llm.call"):
+            chat_completion = llm_executor.call(
+                get_llm_client().chat.completions.create,
+                messages=messages,
+                model=ACADEMIC_MODEL,
+                timeout=LLM_TIMEOUT,
+            )
 
         ai_response = chat_completion.choices[0].message.content
+        answer_cache.put(cache_key, query, ai_response)
         return jsonify({"response": ai_response})
 
+    except LLMSaturated:
+        return llm_busy_response()
+    except FutureTimeout:
+        return jsonify({"response": "❌ AI Error: request timed out."}), 504
     except Exception as e:
         return jsonify({"response": f"❌ AI Error: {str(e)}"})
 
+# ✅ Database Pool Metrics
+@app.route("/db-pool-stats", methods=["GET"])
+def db_pool_stats():
+    return jsonify(db_pool.stats())
+
+# ✅ Certificate Layouts
+# A layout is {"title", "page": [width, height], "elements": [...]} where each element is one of
+#   {"type": "text", "x", "y", "text", "font", "size", "align": "left" | "center" | "right"}
+#   {"type": "rect", "x", "y", "width", "height"}
+#   {"type": "line", "x1", "y1", "x2", "y2"}
+# Text may use {student_id}, {date} and {cert_type}. Elements using {student_id} or {date} are the
+# per-certificate fields; everything else is static and drawn once, when the layout is compiled.
+LAYOUT_FIELDS = {"student_id", "date", "cert_type"}
+CERTIFICATE_FIELDS = {"student_id", "date"}
+LAYOUT_ELEMENT_KEYS = {"text": ("x", "y"), "rect": ("x", "y", "width", "height"), "line": ("x1", "y1", "x2", "y2")}
+
+CERTIFICATE_HEADER = [
+    {"x": 300, "y": 750, "text": "ACADEMIC INSTITUTION", "font": "Helvetica-Bold", "size": 24, "align": "center"},
+    {"x": 300, "y": 700, "text": "{cert_type} Certificate", "font": "Helvetica-Bold", "size": 22, "align": "center"},
+]
+CERTIFICATE_FOOTER = [
+    {"x": 50, "y": 400, "text": "Date: {date}", "size": 14},
+    {"x": 400, "y": 400, "text": "Signature", "size": 14},
+    {"x": 400, "y": 380, "text": "________________", "size": 14},
+    {"x": 400, "y": 360, "text": "Principal", "size": 14},
+    {"type": "rect", "x": 20, "y": 20, "width": 555, "height": 800},
+]
+
+# Built-in layouts for certificates without a stored template PDF
+DEFAULT_LAYOUTS = {
+    "Bonafide": {"elements": CERTIFICATE_HEADER + [
+        {"x": 50, "y": 600, "text": "This is to certify that {student_id} is a bonafide student", "size": 14},
+        {"x": 50, "y": 580, "text": "of our institution and is currently pursuing their education with us.", "size": 14},
+    ] + CERTIFICATE_FOOTER},
+    "NOC": {"elements": CERTIFICATE_HEADER + [
+        {"x": 50, "y": 600, "text": "This is to certify that {student_id} is granted a No Objection", "size": 14},
+        {"x": 50, "y": 580, "text": "Certificate for their intended activities outside the institution.", "size": 14},
+    ] + CERTIFICATE_FOOTER},
+}
+GENERIC_LAYOUT = {"elements": CERTIFICATE_HEADER + CERTIFICATE_FOOTER}
+
+# Drawn over a stored or uploaded template PDF when the type has no layout of its own
+TEMPLATE_OVERLAY_LAYOUT = {"elements": [
+    {"x": 100, "y": 400, "text": "Student ID: {student_id}"},
+    {"x": 100, "y": 380, "text": "Certificate Type: {cert_type}"},
+    {"x": 100, "y": 360, "text": "Date Issued: {date}"},
+]}
+
+
+def layout_fields(text):
+    """Field names used in text; raises ValueError on malformed braces."""
+    return {name for _, name, _, _ in string.Formatter().parse(text) if name is not None}
+
+
+def normalize_layout(layout):
+    """Validated copy of a layout spec with defaults filled in; raises ValueError if it is invalid."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase.pdfmetrics import standardFonts
+
+    def is_number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    if not isinstance(layout, dict) or not isinstance(layout.get("elements"), list):
+        raise ValueError("a layout is an object with an 'elements' list")
+    if not layout["elements"]:
+        raise ValueError("a layout needs at least one element")
+    page = layout.get("page", list(A4))
+    if not (isinstance(page, list) and len(page) == 2 and all(is_number(v) and v > 0 for v in page)):
+        raise ValueError("page must be [width, height] in points")
+    title = layout.get("title", "{cert_type} Certificate")
+    if not isinstance(title, str) or layout_fields(title) - {"cert_type"}:
+        raise ValueError("title must be text and may only use {cert_type}")
+
+    elements = []
+    for i, element in enumerate(layout["elements"]):
+        if not isinstance(element, dict):
+            raise ValueError(f"element {i} must be an object")
+        kind = element.get("type", "text")
+        if kind not in LAYOUT_ELEMENT_KEYS:
+            raise ValueError(f"element {i}: unknown type {kind!r}")
+        normalized = {"type": kind}
+        for key in LAYOUT_ELEMENT_KEYS[kind]:
+            if not is_number(element.get(key)):
+                raise ValueError(f"element {i}: {key} must be a number")
+            normalized[key] = element[key]
+
+        if kind == "text":
+            text = element.get("text")
+            font = element.get("font", "Helvetica")
+            size = element.get("size", 12)
+            align = element.get("align", "left")
+            if not isinstance(text, str):
+                raise ValueError(f"element {i}: text must be a string")
+            unknown = layout_fields(text) - LAYOUT_FIELDS
+            if unknown:
+                raise ValueError(f"element {i}: unknown field(s) {', '.join(sorted(unknown))}")
+            if font not in standardFonts:
+                raise ValueError(f"element {i}: font must be one of {', '.join(standardFonts)}")
+            if not is_number(size) or size <= 0:
+                raise ValueError(f"element {i}: size must be a positive number")
+            if align not in ("left", "center", "right"):
+                raise ValueError(f"element {i}: align must be left, center or right")
+            normalized.update(text=text, font=font, size=size, align=align)
+        elements.append(normalized)
+
+    return {"title": title, "page": page, "elements": elements}
+
+
+def resolve_layout(cert_type, layout_spec, has_template):
+    """The custom layout if one is stored, else the built-in one for this situation."""
+    if layout_spec:
+        return json.loads(layout_spec)
+    if has_template:
+        return normalize_layout(TEMPLATE_OVERLAY_LAYOUT)
+    return normalize_layout(DEFAULT_LAYOUTS.get(cert_type, GENERIC_LAYOUT))
+
+
+def pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+# ✅ Compiled Certificate Templates
+class CompiledTemplate:
+    """A certificate type's render plan: the static page, compiled once, plus the per-certificate fields.
+
+    base is a complete one-page PDF whose page draws the template and the layout's static
+    elements, then an empty content stream (object fields_obj). A certificate is base plus an
+    incremental update replacing that stream with the field text, so rendering one is string
+    formatting only; nothing is parsed, merged or drawn with reportlab per certificate.
+    """
+
+    def __init__(self, stamp, version, base, fields, fields_obj, trailer, prev_xref):
+        self.stamp = stamp
+        self.version = version
+        self.base = base
+        self.fields = fields
+        self.fields_obj = fields_obj
+        self.trailer = trailer
+        self.prev_xref = prev_xref
+        self.size = len(base)
+
+    def render(self, values, output):
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+
+        ops = []
+        for field in self.fields:
+            text = field["text"].format(**values)
+            x = field["x"]
+            if field["align"] != "left":
+                width = stringWidth(text, field["font"], field["size"])
+                x -= width / 2 if field["align"] == "center" else width
+            ops.append(f"BT /{field['resource']} {field['size']} Tf {x:.2f} {field['y']:.2f} Td ({pdf_text(text)}) Tj ET")
+        content = "\n".join(ops).encode("cp1252", "replace")
+
+        update = b"%d 0 obj\n<< /Length %d >>\nstream\n%s\nendstream\nendobj\n" % (self.fields_obj, len(content), content)
+        xref_offset = len(self.base) + len(update)
+        output.write(self.base)
+        output.write(update)
+        output.write(
+            b"xref\n%d 1\n%010d 00000 n \ntrailer\n<< %s /Prev %d >>\nstartxref\n%d\n%%%%EOF\n"
+            % (self.fields_obj, len(self.base), self.trailer, self.prev_xref, xref_offset)
+        )
+
+
+class TemplateCache:
+    """LRU cache of compiled templates, bounded by approximate size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, stamp, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stamp == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Compile outside the lock so other templates are not blocked
+        entry = loader()
+
+        with self._lock:
+            self._discard(key)
+            if entry.size <= self.max_bytes:
+                self._entries[key] = entry
+                self._bytes += entry.size
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.size
+                    self.evictions += 1
+        return entry
+
+    def invalidate(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+
+template_cache = TemplateCache(TEMPLATE_CACHE_MAX_BYTES)
+
+
+def prefix_font_names(page, prefix):
+    """Rename page's font resources with prefix so merge_page never has to.
+
+    When names clash, PyPDF2 picks random replacements, which would make otherwise identical
+    compiled templates differ byte-wise.
+    """
+    from PyPDF2.generic import DictionaryObject, NameObject
+
+    resources = page["/Resources"]
+    fonts = resources.get("/Font", DictionaryObject()).get_object()
+    rename = {name: NameObject(f"/{prefix}{name[1:]}") for name in fonts}
+    resources[NameObject("/Font")] = DictionaryObject({rename[name]: fonts[name] for name in fonts})
+    page[NameObject("/Contents")] = page._content_stream_rename(page.get_contents(), rename, page.pdf)
+
+
+def draw_static_elements(c, elements, cert_type):
+    for element in elements:
+        if element["type"] == "rect":
+            c.rect(element["x"], element["y"], element["width"], element["height"], stroke=1, fill=0)
+        elif element["type"] == "line":
+            c.line(element["x1"], element["y1"], element["x2"], element["y2"])
+        else:
+            c.setFont(element["font"], element["size"])
+            draw = {"left": c.drawString, "center": c.drawCentredString, "right": c.drawRightString}[element["align"]]
+            draw(element["x"], element["y"], element["text"].format(cert_type=cert_type))
+
+
+def compile_template(template_data, layout, cert_type, stamp):
+    """Compile layout, drawn over template_data's first page (or a blank page), into a CompiledTemplate."""
+    import PyPDF2
+    from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject
+    from reportlab.pdfgen import canvas
+
+    static = []
+    fields = []
+    for element in layout["elements"]:
+        if element["type"] == "text" and layout_fields(element["text"]) & CERTIFICATE_FIELDS:
+            fields.append(dict(element))
+        else:
+            static.append(element)
+
+    # Static elements are drawn once here and become part of the page
+    static_bytes = io.BytesIO()
+    c = canvas.Canvas(static_bytes, pagesize=layout["page"], invariant=1)
+    draw_static_elements(c, static, cert_type)
+    # Explicit, so the PDF has its page even when every element is a per-certificate field
+    c.showPage()
+    c.save()
+    static_bytes.seek(0)
+
+    with span("pdf.parse"):
+        page = PyPDF2.PdfReader(static_bytes).pages[0]
+        if template_data is not None:
+            static_page = page
+            prefix_font_names(static_page, "Static")
+            page = PyPDF2.PdfReader(io.BytesIO(template_data)).pages[0]
+            page.merge_page(static_page)
+
+    writer = PyPDF2.PdfWriter()
+    page = writer.add_page(page)
+    writer.add_metadata({"/Title": layout["title"].format(cert_type=cert_type)})
+
+    # Standard fonts used by the fields, under names of their own
+    resources = page["/Resources"]
+    fonts = resources.get("/Font", DictionaryObject()).get_object()
+    resources[NameObject("/Font")] = fonts
+    for i, font in enumerate(sorted({field["font"] for field in fields}), 1):
+        font_dict = DictionaryObject({
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject(f"/{font}"),
+        })
+        if font not in ("Symbol", "ZapfDingbats"):
+            font_dict[NameObject("/Encoding")] = NameObject("/WinAnsiEncoding")
+        fonts[NameObject(f"/Field{i}")] = font_dict
+        for field in fields:
+            if field["font"] == font:
+                field["resource"] = f"Field{i}"
+
+    # Page contents: q, the existing streams, Q (so fields start from a clean graphics state), fields
+    def stream(data):
+        obj = DecodedStreamObject()
+        obj.set_data(data)
+        return writer._add_object(obj)
+
+    contents = page.raw_get("/Contents") if "/Contents" in page else ArrayObject()
+    resolved = contents.get_object()
+    parts = list(resolved) if isinstance(resolved, ArrayObject) else [contents]
+    fields_ref = stream(b"")
+    page[NameObject("/Contents")] = ArrayObject([stream(b"q\n"), *parts, stream(b"\nQ\n"), fields_ref])
+
+    base = io.BytesIO()
+    writer.write(base)
+    base = base.getvalue()
+
+    # The incremental update's trailer repeats the base trailer and points back at its xref
+    trailer = PyPDF2.PdfReader(io.BytesIO(base)).trailer
+    prev_xref = int(base[base.rindex(b"startxref") + len(b"startxref"):].split()[0])
+    trailer_entries = b"/Size %d /Root %d 0 R" % (trailer["/Size"], trailer.raw_get("/Root").idnum)
+    if "/Info" in trailer:
+        trailer_entries += b" /Info %d 0 R" % trailer.raw_get("/Info").idnum
+
+    version = hashlib.sha256(
+        json.dumps(layout, sort_keys=True).encode() + b"\0" + (template_data or b"")
+    ).hexdigest()
+    return CompiledTemplate(stamp, version, base, fields, fields_ref.idnum, trailer_entries, prev_xref)
+
+
+def certificate_source(cert_type):
+    """(stored template path or None, custom layout JSON or None, layout version) for cert_type."""
+    conn = get_db_connection()
+    template = conn.execute(
+        "SELECT file_path FROM certificate_templates WHERE template_type = ?", (cert_type,)
+    ).fetchone()
+    layout = conn.execute(
+        "SELECT spec, version FROM certificate_layouts WHERE template_type = ?", (cert_type,)
+    ).fetchone()
+    conn.close()
+
+    template_path = template["file_path"] if template and os.path.exists(template["file_path"]) else None
+    if layout:
+        return template_path, layout["spec"], layout["version"]
+    return template_path, None, "builtin"
+
+
+def get_compiled_certificate(cert_type, source, template_data=None):
+    """Cached render plan for cert_type from certificate_source(), or over template_data if one was uploaded.
+
+    Stored plans are recompiled whenever the template file or the layout changes.
+    """
+    template_path, layout_spec, layout_version = source
+
+    if template_data is not None:
+        digest = hashlib.sha256(template_data).hexdigest()
+        key, stamp = f"upload:{cert_type}:{digest}", (digest, layout_version)
+    elif template_path:
+        st = os.stat(template_path)
+        key, stamp = cert_type, (template_path, st.st_mtime_ns, st.st_size, layout_version)
+    else:
+        key, stamp = cert_type, (None, layout_version)
+
+    def load():
+        data = template_data
+        if data is None and template_path:
+            with span("file.io"), open(template_path, "rb") as f:
+                data = f.read()
+        layout = resolve_layout(cert_type, layout_spec, data is not None)
+        return compile_template(data, layout, cert_type, stamp)
+
+    return template_cache.get(key, stamp, load)
+
+# ✅ Template Preprocessing
+class TemplateRejected(Exception):
+    """An uploaded template that can't be stored; diagnostics say why."""
+
+    def __init__(self, message, status, diagnostics):
+        super().__init__(message)
+        self.status = status
+        self.diagnostics = diagnostics
+
+
+def prepare_template(template_data):
+    """Validate a template PDF and reduce it to an optimized copy of page 0.
+
+    Returns (optimized bytes, metadata). Only page 0 is copied into a fresh writer, so other
+    pages and unreferenced objects are dropped, and its content streams are compressed.
+    """
+    import PyPDF2
+    from PyPDF2.generic import DictionaryObject
+
+    start = time.perf_counter()
+    diagnostics = {"source_bytes": len(template_data)}
+
+    def reject(message, status=400):
+        diagnostics["prepare_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        raise TemplateRejected(message, status, diagnostics)
+
+    if len(template_data) > TEMPLATE_MAX_UPLOAD_BYTES:
+        diagnostics["max_upload_bytes"] = TEMPLATE_MAX_UPLOAD_BYTES
+        reject("Template file is too large.", 413)
+
+    try:
+        with span("pdf.parse"):
+            reader = PyPDF2.PdfReader(io.BytesIO(template_data))
+            if reader.is_encrypted:
+                reject("Encrypted templates are not supported.")
+            diagnostics["source_pages"] = len(reader.pages)
+            if not reader.pages:
+                reject("Template has no pages.")
+
+            writer = PyPDF2.PdfWriter()
+            writer.add_page(reader.pages[0])
+            page = writer.pages[0]
+            page.compress_content_streams()
+            output = io.BytesIO()
+            writer.write(output)
+    except TemplateRejected:
+        raise
+    except Exception as e:
+        reject(f"Template is not a readable PDF: {e}")
+
+    resources = page.get("/Resources", DictionaryObject()).get_object()
+    fonts = resources.get("/Font", DictionaryObject()).get_object()
+    xobjects = resources.get("/XObject", DictionaryObject()).get_object()
+    template_bytes = output.getvalue()
+    diagnostics.update({
+        "page_width": float(page.mediabox.width),
+        "page_height": float(page.mediabox.height),
+        "page_rotation": page.get("/Rotate", 0),
+        "fonts": len(fonts),
+        "images": sum(1 for name in xobjects if xobjects[name].get("/Subtype") == "/Image"),
+        "template_bytes": len(template_bytes),
+        "content_hash": hashlib.sha256(template_bytes).hexdigest(),
+    })
+    if len(template_bytes) > TEMPLATE_MAX_BYTES:
+        diagnostics["max_bytes"] = TEMPLATE_MAX_BYTES
+        reject("Template is too large even after optimization (large embedded images?).", 413)
+
+    diagnostics["prepare_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return template_bytes, diagnostics
+
+
+def read_template_upload(upload):
+    """Read an uploaded template, checking its size on the spooled stream before loading it."""
+    stream = upload.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    if size > TEMPLATE_MAX_UPLOAD_BYTES:
+        diagnostics = {"source_bytes": size, "max_upload_bytes": TEMPLATE_MAX_UPLOAD_BYTES}
+        raise TemplateRejected("Template file is too large.", 413, diagnostics)
+    return stream.read()
+
+
+def write_template_file(path, template_data):
+    # Replace atomically so a concurrent render never reads a half-written template
+    with span("file.io"):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(template_data)
+        os.replace(tmp_path, path)
+
+
+def save_template_record(cursor, template_type, template_path, metadata):
+    cursor.execute("""
+        INSERT OR REPLACE INTO certificate_templates (
+            template_type, file_path, page_width, page_height, page_rotation, fonts, images,
+            source_pages, source_bytes, template_bytes, content_hash, prepared_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        template_type, template_path, metadata["page_width"], metadata["page_height"],
+        metadata["page_rotation"], metadata["fonts"], metadata["images"], metadata["source_pages"],
+        metadata["source_bytes"], metadata["template_bytes"], metadata["content_hash"], utc_timestamp()
+    ))
+
 # ✅ Set Certificate Template API (Admin)
 @app.route("/set-template", methods=["POST"])
 def set_template():
+    # Refuse on the declared size before Werkzeug parses (and spools) the multipart body
+    if (request.content_length or 0) > TEMPLATE_MAX_UPLOAD_BYTES + TEMPLATE_UPLOAD_OVERHEAD_BYTES:
+        diagnostics = {"request_bytes": request.content_length, "max_upload_bytes": TEMPLATE_MAX_UPLOAD_BYTES}
+        return jsonify({"message": "❌ Template file is too large.", "diagnostics": diagnostics}), 413
+
     if "template" not in request.files:
         return jsonify({"message": "❌ No template file uploaded."}), 400
 
@@ -260,28 +2807,273 @@ def set_template():
     if not template_type:
         return jsonify({"message": "❌ Template type not specified."}), 400
 
-    template_file = request.files["template"]
+    # Validate and optimize now so every later render starts from a small single-page template
+    try:
+        template_data, metadata = prepare_template(read_template_upload(request.files["template"]))
+    except TemplateRejected as e:
+        return jsonify({"message": f"❌ {e}", "diagnostics": e.diagnostics}), e.status
 
-    # Save the template file
+    # Save the optimized template file
     template_filename = f"{template_type.lower()}_template.pdf"
     template_path = os.path.join(TEMPLATES_DIR, template_filename)
-    template_file.save(template_path)
+    write_template_file(template_path, template_data)
 
     # Update the database
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        "INSERT OR REPLACE INTO certificate_templates (template_type, file_path) VALUES (?, ?)",
-        (template_type, template_path)
-    )
+    save_template_record(cursor, template_type, template_path, metadata)
+    conn.commit()
+    conn.close()
+
+    template_cache.invalidate(template_type)
+    artifact_store.invalidate(template_type)
+
+    return jsonify({"message": f"✅ {template_type} template updated successfully.", "template": metadata})
+
+# ✅ Certificate Layout API (Admin)
+@app.route("/set-layout", methods=["POST"])
+def set_layout():
+    """Store a custom layout for a template type; "layout": null goes back to the built-in one."""
+    data = request.json or {}
+    template_type = data.get("template_type")
+    if not template_type:
+        return jsonify({"message": "❌ Template type not specified."}), 400
+
+    conn = get_db_connection()
+    if data.get("layout") is None:
+        conn.execute("DELETE FROM certificate_layouts WHERE template_type = ?", (template_type,))
+        layout = version = None
+    else:
+        try:
+            layout = normalize_layout(data["layout"])
+        except ValueError as e:
+            conn.close()
+            return jsonify({"message": f"❌ Invalid layout: {e}"}), 400
+        spec = json.dumps(layout, sort_keys=True)
+        version = hashlib.sha256(spec.encode()).hexdigest()[:16]
+        conn.execute("""
+            INSERT INTO certificate_layouts (template_type, spec, version, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (template_type) DO UPDATE SET
+                spec = excluded.spec, version = excluded.version, updated_at = excluded.updated_at
+        """, (template_type, spec, version, utc_timestamp()))
+    conn.commit()
+    conn.close()
+
+    template_cache.invalidate(template_type)
+    artifact_store.invalidate(template_type)
+
+    return jsonify({"message": f"✅ {template_type} layout updated successfully.", "layout": layout, "version": version})
+
+
+@app.route("/layout", methods=["GET"])
+def get_layout():
+    """The layout certificates of template_type are currently rendered with."""
+    template_type = request.args.get("template_type")
+    if not template_type:
+        return jsonify({"message": "❌ Template type not specified."}), 400
+
+    template_path, layout_spec, version = certificate_source(template_type)
+    return jsonify({
+        "template_type": template_type,
+        "custom": layout_spec is not None,
+        "version": version,
+        "layout": resolve_layout(template_type, layout_spec, template_path is not None),
+    })
+
+# ✅ Certificate Rendering
+def certificate_filename(student_id, cert_type):
+    return f"{student_id}_{cert_type.lower()}_certificate.pdf"
+
+
+def render_certificate(student_id, cert_type, compiled, output, issue_date=None):
+    """Write one certificate PDF to output (a binary file object)."""
+    compiled.render({
+        "student_id": student_id,
+        "cert_type": cert_type,
+        "date": (issue_date or datetime.date.today()).strftime("%d-%m-%Y"),
+    }, output)
+
+# ✅ Certificate Artifact Store
+class ArtifactStore:
+    """Rendered certificates on disk, addressed by a hash of everything that went into them.
+
+    Files live under root/<cert type>/ and the least recently used are evicted past max_bytes.
+    Each process indexes the directory on first use and bumps a file's mtime when it reads it,
+    so recency survives restarts (the byte count is per process, so the cap is approximate
+    across gunicorn workers).
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None
+        self._bytes = 0
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_renders = 0
+
+    def key(self, *parts):
+        return hashlib.sha256("\0".join(str(p) for p in parts).encode()).hexdigest()
+
+    def type_dir(self, cert_type):
+        return os.path.join(self.root, re.sub(r"[^\w-]", "_", cert_type))
+
+    def path(self, cert_type, key):
+        return os.path.join(self.type_dir(cert_type), key[:2], f"{key}.pdf")
+
+    def _load_index(self):
+        # Called with the lock held: path -> size, least recently used first
+        if self._index is not None:
+            return
+        files = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".pdf"):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((st.st_mtime, path, st.st_size))
+        self._index = OrderedDict((path, size) for _, path, size in sorted(files))
+        self._bytes = sum(self._index.values())
+
+    def get(self, cert_type, key):
+        path = self.path(cert_type, key)
+        try:
+            with span("file.io"), open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                if self._index is not None and path in self._index:
+                    self._bytes -= self._index.pop(path)
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._load_index()
+            if path not in self._index:
+                self._bytes += len(data)
+            self._index[path] = len(data)
+            self._index.move_to_end(path)
+        return data
+
+    def put(self, cert_type, key, data):
+        path = self.path(cert_type, key)
+        with span("file.io"):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a private temp file first so readers never see a partial PDF
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._load_index()
+            self._bytes += len(data) - self._index.pop(path, 0)
+            self._index[path] = len(data)
+            while self._bytes > self.max_bytes and len(self._index) > 1:
+                old_path, size = self._index.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(old_path)
+                except FileNotFoundError:
+                    pass
+
+    def get_or_render(self, cert_type, key, render):
+        """Stored PDF for key, or render() it; concurrent callers for the same key share one render."""
+        data = self.get(cert_type, key)
+        if data is not None:
+            return data
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.shared_renders += 1
+        if not owner:
+            return future.result()
+
+        try:
+            data = render()
+            self.put(cert_type, key, data)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def invalidate(self, cert_type):
+        """Drop every stored certificate of cert_type (its template changed)."""
+        type_dir = self.type_dir(cert_type)
+        with self._lock:
+            if self._index is not None:
+                for path in [p for p in self._index if p.startswith(type_dir + os.sep)]:
+                    self._bytes -= self._index.pop(path)
+        shutil.rmtree(type_dir, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            self._load_index()
+            return {
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "shared_renders": self.shared_renders,
+            }
+
+
+artifact_store = ArtifactStore(CERT_ARTIFACT_DIR, CERT_ARTIFACT_MAX_BYTES)
+
+
+def claim_idempotency_key(idempotency_key, fingerprint, issue_date):
+    """(issue date, replayed) for idempotency_key, recording issue_date if the key is new.
+
+    The issue date is None if the key was already used for a different request.
+    """
+    now = time.time()
+    conn = get_db_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("DELETE FROM certificate_requests WHERE created_at < ?", (now - CERT_IDEMPOTENCY_TTL,))
+    row = conn.execute(
+        "SELECT fingerprint, issue_date FROM certificate_requests WHERE idempotency_key = ?", (idempotency_key,)
+    ).fetchone()
+    if row is None:
+        conn.execute(
+            "INSERT INTO certificate_requests (idempotency_key, fingerprint, issue_date, created_at) VALUES (?, ?, ?, ?)",
+            (idempotency_key, fingerprint, issue_date.isoformat(), now)
+        )
     conn.commit()
     conn.close()
 
-    return jsonify({"message": f"✅ {template_type} template updated successfully."})
+    if row is None:
+        return issue_date, False
+    if row["fingerprint"] != fingerprint:
+        return None, False
+    return datetime.date.fromisoformat(row["issue_date"]), True
 
 # ✅ Generate Certificate API
-@app.route("/certificate", methods=["POST"])
+@app.route("/certificate", methods=["GET", "POST"])
 def generate_certificate():
+    """Certificate PDF for a student, memoized per (student, type, template version, issue date).
+
+    The ETag is that memo key, so GET with If-None-Match gets a 304 without rendering. An
+    Idempotency-Key header replays the first response for the same key (same issue date).
+    """
     # Check if it's a multipart form data (with template file)
     if request.files and "template" in request.files:
         student_id = request.form.get("student_id")
@@ -289,118 +3081,260 @@ def generate_certificate():
         template_file = request.files["template"]
 
         # Use the uploaded template
-        custom_template = True
-        template_data = template_file.read()
+        compiled = get_compiled_certificate(cert_type, certificate_source(cert_type), template_file.read())
     else:
         # JSON data without custom template
         if request.is_json:
             data = request.json
+        elif request.method == "GET":
+            data = request.args
         else:
             data = request.form
 
         student_id = data.get("student_id")
         cert_type = data.get("cert_type")
 
-        # Check if there's a stored template
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT file_path FROM certificate_templates WHERE template_type = ?", (cert_type,))
-        template_record = cursor.fetchone()
-        conn.close()
-
-        if template_record and os.path.exists(template_record["file_path"]):
-            custom_template = True
-            with open(template_record["file_path"], "rb") as f:
-                template_data = f.read()
-        else:
-            custom_template = False
+        # Stored template and/or layout for this type
+        compiled = get_compiled_certificate(cert_type, certificate_source(cert_type))
+
+    template_version = compiled.version
+    issue_date = datetime.date.today()
+    replayed = False
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key:
+        fingerprint = artifact_store.key(student_id, cert_type, template_version)
+        issue_date, replayed = claim_idempotency_key(idempotency_key, fingerprint, issue_date)
+        if issue_date is None:
+            return jsonify({"message": "❌ Idempotency-Key was already used for a different certificate."}), 422
+
+    artifact_key = artifact_store.key(student_id, cert_type, template_version, issue_date.isoformat())
+    if request.method == "GET" and request.if_none_match.contains(artifact_key):
+        response = Response(status=304)
+    else:
+        def render():
+            output = io.BytesIO()
+            with span("pdf.render"):
+                render_certificate(student_id, cert_type, compiled, output, issue_date)
+            return output.getvalue()
+
+        # Send the file
+        try:
+            pdf_bytes = artifact_store.get_or_render(cert_type, artifact_key, render)
+            response = send_file(
+                io.BytesIO(pdf_bytes), mimetype="application/pdf", as_attachment=True,
+                download_name=certificate_filename(student_id, cert_type), etag=False
+            )
+        except Exception as e:
+            return jsonify({"message": f"❌ Error generating certificate: {str(e)}"}), 500
+
+    response.set_etag(artifact_key)
+    response.headers["Cache-Control"] = "private, no-cache"
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+# ✅ Bulk Certificate Generation API
+def render_certificate_batch(student_ids, cert_type, source):
+    """Process-pool task: render a chunk of certificates and return (student_id, pdf bytes) pairs."""
+    compiled = get_compiled_certificate(cert_type, source)
+    results = []
+    for student_id in student_ids:
+        output = io.BytesIO()
+        render_certificate(student_id, cert_type, compiled, output)
+        results.append((student_id, output.getvalue()))
+    return results
+
+
+BATCH_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def get_batch_pool():
+    global batch_pool
+    with batch_pool_lock:
+        if batch_pool is None:
+            # Never fork this (multi-threaded) process: a child could inherit a lock held by another thread.
+            # Forkserver/spawn children start clean and import backend, which has no import-time side effects.
+            batch_pool = ProcessPoolExecutor(
+                max_workers=CERT_BATCH_WORKERS, mp_context=multiprocessing.get_context(BATCH_START_METHOD)
+            )
+        return batch_pool
+
+
+def batch_results(futures):
+    """Yield each chunk's results in order; a broken pool is dropped so the next batch gets a new one."""
+    global batch_pool
+    try:
+        for future in futures:
+            yield future.result()
+    except BrokenProcessPool:
+        with batch_pool_lock:
+            batch_pool = None
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
 
-    # Create the certificate file path
-    filename = f"{student_id}_{cert_type.lower()}_certificate.pdf"
-    filepath = os.path.join(os.getcwd(), filename)
 
-    if custom_template:
-        # Save the template temporarily to use it
-        temp_template_path = os.path.join(os.getcwd(), "temp_template.pdf")
-        with open(temp_template_path, "wb") as f:
-            f.write(template_data)
+class StreamSink:
+    """Write-only file object that hands buffered bytes to a streaming response."""
 
-        # Use PyPDF2 to modify the template
-        reader = PyPDF2.PdfReader(temp_template_path)
-        writer = PyPDF2.PdfWriter()
+    closed = False
 
-        # Get the first page
-        page = reader.pages[0]
+    def __init__(self):
+        self.chunks = []
 
-        # Create a new PDF to overlay the data
-        overlay_bytes = io.BytesIO()
-        c = canvas.Canvas(overlay_bytes)
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
 
-        # Add the certificate data
-        c.setFont("Helvetica", 12)
-        c.drawString(100, 400, f"Student ID: {student_id}")
-        c.drawString(100, 380, f"Certificate Type: {cert_type}")
-        current_date = datetime.date.today().strftime("%d-%m-%Y")
-        c.drawString(100, 360, f"Date Issued: {current_date}")
-        c.save()
+    def flush(self):
+        pass
 
-        # Create a new PDF reader from the overlay data
-        overlay_bytes.seek(0)
-        overlay_pdf = PyPDF2.PdfReader(overlay_bytes)
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
 
-        # Merge the template with the overlay
-        page.merge_page(overlay_pdf.pages[0])
-        writer.add_page(page)
 
-        # Save the merged PDF
-        with open(filepath, "wb") as output_file:
-            writer.write(output_file)
-
-        # Clean up the temporary template
-        if os.path.exists(temp_template_path):
-            os.remove(temp_template_path)
+@app.route("/certificates/batch", methods=["POST"])
+def generate_certificate_batch():
+    # Student IDs come either as a JSON list or as an uploaded CSV
+    if request.files and "students" in request.files:
+        import pandas as pd
 
+        data = request.form
+        df = pd.read_csv(request.files["students"], dtype=str)
+        column = "student_id" if "student_id" in df.columns else df.columns[0]
+        student_ids = df[column].dropna().str.strip().tolist()
     else:
-        # Generate a standard certificate
-        c = canvas.Canvas(filepath)
-
-        # Set up the certificate
-        c.setTitle(f"{cert_type} Certificate")
-        c.setFont("Helvetica-Bold", 24)
-
-        # Certificate header
-        c.drawCentredString(300, 750, "ACADEMIC INSTITUTION")
-        c.setFont("Helvetica-Bold", 22)
-        c.drawCentredString(300, 700, f"{cert_type} Certificate")
-
-        # Certificate content
-        c.setFont("Helvetica", 14)
-        current_date = datetime.date.today().strftime("%d-%m-%Y")
-
-        if cert_type == "Bonafide":
-            c.drawString(50, 600, f"This is to certify that {student_id} is a bonafide student")
-            c.drawString(50, 580, "of our institution and is currently pursuing their education with us.")
-        elif cert_type == "NOC":
-            c.drawString(50, 600, f"This is to certify that {student_id} is granted a No Objection")
-            c.drawString(50, 580, "Certificate for their intended activities outside the institution.")
-
-        # Footer
-        c.drawString(50, 400, f"Date: {current_date}")
-        c.drawString(400, 400, "Signature")
-        c.drawString(400, 380, "________________")
-        c.drawString(400, 360, "Principal")
-
-        # Add a border
-        c.rect(20, 20, 555, 800, stroke=1, fill=0)
-
-        # Save the PDF
-        c.save()
-
-    # Send the file
+        data = request.json or {}
+        student_ids = [str(s) for s in data.get("student_ids", [])]
+
+    cert_type = data.get("cert_type")
+    output_format = data.get("format", "zip")
+
+    if not cert_type:
+        return jsonify({"message": "❌ Certificate type not specified."}), 400
+    if not student_ids:
+        return jsonify({"message": "❌ No student IDs provided."}), 400
+    if len(student_ids) > CERT_BATCH_MAX:
+        return jsonify({"message": f"❌ Batch too large. Maximum is {CERT_BATCH_MAX} students."}), 400
+    if output_format not in ("zip", "pdf"):
+        return jsonify({"message": "❌ Invalid format. Supported formats: zip, pdf"}), 400
+
+    source = certificate_source(cert_type)
+    chunks = [student_ids[i:i + CERT_BATCH_CHUNK] for i in range(0, len(student_ids), CERT_BATCH_CHUNK)]
+    pool = get_batch_pool()
+    rendered = batch_results([pool.submit(render_certificate_batch, chunk, cert_type, source) for chunk in chunks])
+
+    # Wait for the first chunk so a failing render (or a broken pool) is still reported as a 500
     try:
-        return send_file(filepath, as_attachment=True)
+        first = next(rendered)
     except Exception as e:
-        return jsonify({"message": f"❌ Error generating certificate: {str(e)}"}),
+        rendered.close()
+        app.logger.exception("Bulk certificate render failed")
+        return jsonify({"message": f"❌ Error generating certificates: {e}"}), 500
+
+    if output_format == "pdf":
+        import PyPDF2
+
+        writer = PyPDF2.PdfWriter()
+        try:
+            for results in itertools.chain([first], rendered):
+                for _, pdf_bytes in results:
+                    for page in PyPDF2.PdfReader(io.BytesIO(pdf_bytes)).pages:
+                        writer.add_page(page)
+        except Exception as e:
+            rendered.close()
+            app.logger.exception("Bulk certificate render failed")
+            return jsonify({"message": f"❌ Error generating certificates: {e}"}), 500
+        merged = io.BytesIO()
+        writer.write(merged)
+        merged.seek(0)
+        return send_file(
+            merged, mimetype="application/pdf", as_attachment=True,
+            download_name=f"{cert_type.lower()}_certificates.pdf"
+        )
+
+    def generate_zip():
+        sink = StreamSink()
+        # PDFs are already compressed, so entries are stored as-is
+        archive = zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED)
+        try:
+            for results in itertools.chain([first], rendered):
+                for student_id, pdf_bytes in results:
+                    archive.writestr(certificate_filename(student_id, cert_type), pdf_bytes)
+                yield sink.drain()
+        except Exception:
+            # Headers are already sent: re-raise so the server drops the connection before the
+            # final chunk and the central directory, leaving a transfer the client sees as incomplete
+            app.logger.exception("Bulk certificate render failed mid-stream")
+            raise
+        finally:
+            rendered.close()
+        archive.close()
+        yield sink.drain()
+
+    return Response(
+        stream_with_context(generate_zip()),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={cert_type.lower()}_certificates.zip"}
+    )
+
+# ✅ Prometheus Metrics
+def stats_gauges(prefix, stats):
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, (int, float)):
+            lines += [f"# TYPE backend_{prefix}_{key} gauge", f"backend_{prefix}_{key} {value}"]
+    return lines
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    if not METRICS_ENABLED:
+        return jsonify({"message": "❌ Metrics are disabled (METRICS_ENABLED=0)."}), 404
+
+    lines = metrics.render()
+    lines += stats_gauges("db_pool", db_pool.stats())
+    lines += stats_gauges("template_cache", template_cache.stats())
+    lines += stats_gauges("academic_cache", answer_cache.stats())
+    lines += stats_gauges("llm", llm_executor.stats())
+    lines += stats_gauges("certificate_cache", artifact_store.stats())
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+# ✅ App Factory
+app_initialized = False
+app_init_lock = threading.Lock()
+
+
+def create_app(warm=False):
+    """Run one-time setup (directories, schema migrations) and return the Flask app.
+
+    Importing backend has no side effects; call this once per process, or once in the
+    gunicorn master with preload_app. warm=True also imports the heavy modules and builds
+    the LLM client so preloaded workers share them copy-on-write instead of loading their own.
+    """
+    global app_initialized
+    with app_init_lock:
+        if not app_initialized:
+            os.makedirs(TEMPLATES_DIR, exist_ok=True)
+            initialize_db()
+            # Don't let a pooled connection opened here cross a fork into the workers
+            db_pool.close_idle()
+            app_initialized = True
+
+    if warm:
+        for module in HEAVY_MODULES:
+            importlib.import_module(module)
+        get_llm_client()
+    return app
+
 # ✅ Run Server
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app()
+    # `python backend.py worker` runs only the job workers, in a separate process
+    if sys.argv[1:] == ["worker"]:
+        job_workers.run_forever()
+    else:
+        app.run(debug=True)
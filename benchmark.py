@@ -0,0 +1,650 @@
+"""Performance benchmarks for the leave management backend.
+
+Usage:
+    python benchmark.py queries --rows 1000000
+    python benchmark.py routes --target client --requests 200 --concurrency 8 --output before.json
+    python benchmark.py routes --target gunicorn --requests 500 --concurrency 16
+    python benchmark.py startup --runs 10
+    python benchmark.py leave-stress --target gunicorn --workers 4 --concurrency 32
+    python benchmark.py compare before.json after.json
+
+Every run works in a scratch directory with its own SQLite database, so the real
+leave_management.db and templates/ are never touched. The Groq client is replaced
+by a stub with a fixed latency (--llm-latency).
+"""
+import argparse
+import atexit
+import datetime
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import Counter
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ✅ Helpers
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds."""
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def time_query(cursor, sql, params_list):
+    samples = []
+    for params in params_list:
+        start = time.perf_counter()
+        cursor.execute(sql, params).fetchall()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_workdir():
+    """Scratch directory for the backend's database, templates and job files."""
+    workdir = tempfile.mkdtemp(prefix="backend-bench-")
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    return workdir
+
+
+def load_backend(workdir, llm_latency=0.0):
+    """Import and initialize backend.py against a scratch database with the LLM client stubbed out."""
+    os.environ["DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    import backend
+
+    backend.client = StubLLMClient(llm_latency)
+    backend.create_app()
+    return backend
+
+
+# ✅ Stub LLM Client
+class StubLLMClient:
+    """Stands in for groq.Groq: sleeps for `latency` seconds and returns a canned answer."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, messages, model, stream=False, **kwargs):
+        time.sleep(self.latency)
+        words = ["This ", "is ", "a ", "benchmark ", "answer."]
+        if stream:
+            return iter(
+                types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=w))])
+                for w in words
+            )
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content="".join(words)))]
+        )
+
+
+def create_stub_app():
+    """Gunicorn entry point: `gunicorn "benchmark:create_stub_app()"` with BENCH_WORKDIR set."""
+    backend = load_backend(os.environ["BENCH_WORKDIR"], float(os.getenv("BENCH_LLM_LATENCY", 0)))
+    return backend.app
+
+
+# ✅ Leave Query Benchmark
+LEAVE_QUERIES = {
+    "student_leave_status": (
+        "SELECT mentor_id, days, start_date, end_date, status FROM leave_requests WHERE student_id = ?"
+    ),
+    "mentor_leave_requests": (
+        "SELECT id, student_id, days, start_date, end_date, status FROM leave_requests "
+        "WHERE mentor_id = ? AND status = 'pending'"
+    ),
+    "student_leave_overlap": (
+        "SELECT id FROM leave_requests WHERE student_id = ? AND start_date < '2022-06-01' "
+        "AND end_date > '2022-05-20' AND status IN ('pending', 'approved') LIMIT 1"
+    ),
+}
+
+
+def seed_leave_requests(conn, rows, students, mentors):
+    rng = random.Random(42)
+    start = time.perf_counter()
+    epoch = datetime.date(2020, 1, 1)
+
+    def generate():
+        for _ in range(rows):
+            day = rng.randrange(0, 5 * 365)
+            days = rng.randint(1, 15)
+            start_date = (epoch + datetime.timedelta(days=day)).isoformat()
+            end_date = (epoch + datetime.timedelta(days=day + days)).isoformat()
+            status = rng.choices(["pending", "approved", "rejected"], weights=[1, 8, 1])[0]
+            yield (f"S{rng.randrange(students)}", f"M{rng.randrange(mentors)}", days, start_date, end_date, status)
+
+    conn.executemany(
+        "INSERT INTO leave_requests (student_id, mentor_id, days, start_date, end_date, status) VALUES (?, ?, ?, ?, ?, ?)",
+        generate()
+    )
+    conn.commit()
+    return time.perf_counter() - start
+
+
+def bench_queries(args):
+    backend = load_backend(make_workdir())
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        backend.create_tables(conn.cursor())
+        seed_seconds = seed_leave_requests(conn, args.rows, args.students, args.mentors)
+
+        params = {
+            "student_leave_status": [(f"S{rng.randrange(args.students)}",) for _ in range(args.iterations)],
+            "mentor_leave_requests": [(f"M{rng.randrange(args.mentors)}",) for _ in range(args.iterations)],
+            "student_leave_overlap": [(f"S{rng.randrange(args.students)}",) for _ in range(args.iterations)],
+        }
+        cursor = conn.cursor()
+        before = {name: time_query(cursor, sql, params[name]) for name, sql in LEAVE_QUERIES.items()}
+
+        start = time.perf_counter()
+        version = backend.apply_migrations(conn)
+        migrate_seconds = time.perf_counter() - start
+
+        after = {name: time_query(cursor, sql, params[name]) for name, sql in LEAVE_QUERIES.items()}
+        conn.close()
+
+    return {
+        "rows": args.rows,
+        "seed_seconds": round(seed_seconds, 3),
+        "schema_version": version,
+        "migrate_seconds": round(migrate_seconds, 3),
+        "before": before,
+        "after": after,
+    }
+
+
+# ✅ Route Benchmark
+def seed_routes(backend, args):
+    """Mentor assignments, historical leave, a stored template and an academic corpus."""
+    rng = random.Random(11)
+    conn = backend.get_db_connection()
+    conn.executemany(
+        "INSERT OR REPLACE INTO mentor_assignments (student_id, mentor_id) VALUES (?, ?)",
+        [(f"S{i}", f"M{i % args.mentors}") for i in range(args.students)]
+    )
+    conn.commit()
+    seed_leave_requests(conn, args.leaves, args.students, args.mentors)
+    source_id = backend.start_source(conn, "benchmark", None, None, "seed")
+    backend.store_documents(conn, source_id, [
+        (f"row {i + 1}", f"Course {i} covers topic{rng.randrange(200)} and topic{rng.randrange(200)} in week {i % 14}.")
+        for i in range(args.docs)
+    ])
+    backend.finish_source(conn, source_id, "benchmark")
+    conn.close()
+
+    # Stored Bonafide template for the custom-template certificate scenario
+    from reportlab.pdfgen import canvas
+
+    template = io.BytesIO()
+    c = canvas.Canvas(template)
+    c.setFont("Helvetica-Bold", 24)
+    c.drawCentredString(300, 750, "ACADEMIC INSTITUTION")
+    c.rect(20, 20, 555, 800, stroke=1, fill=0)
+    c.save()
+    return template.getvalue()
+
+
+def upload_csv(rows):
+    lines = ["student_id,course,credits"] + [f"S{i},Course {i % 40},{i % 5}" for i in range(rows)]
+    return "\n".join(lines).encode()
+
+
+def mentor_csv(rows, round_):
+    """Assignments for the first `rows` seeded students; each round moves every student to another mentor."""
+    lines = ["student_id,mentor_id"] + [f"S{i},M{(i + round_) % 1000}" for i in range(rows)]
+    return "\n".join(lines).encode()
+
+
+def build_scenarios(args):
+    """Scenario name -> fn(rng, i) returning the request to send."""
+    csv_bytes = upload_csv(args.upload_rows)
+    return {
+        "leave_submit": lambda rng, i: {
+            "method": "POST", "path": "/leave",
+            "json": {"student_id": f"S{rng.randrange(args.students)}", "days": rng.randint(1, 12)},
+        },
+        "mentor_listing": lambda rng, i: {
+            "method": "GET", "path": "/mentor-leave-requests",
+            "params": {"mentor_id": f"M{rng.randrange(args.mentors)}"},
+        },
+        "certificate_default": lambda rng, i: {
+            "method": "POST", "path": "/certificate",
+            "json": {"student_id": f"S{rng.randrange(args.students)}", "cert_type": "NOC"},
+        },
+        "certificate_template": lambda rng, i: {
+            "method": "POST", "path": "/certificate",
+            "json": {"student_id": f"S{rng.randrange(args.students)}", "cert_type": "Bonafide"},
+        },
+        "upload_csv": lambda rng, i: {
+            "method": "POST", "path": "/upload-data",
+            # A new source each time, otherwise every upload after the first is skipped as unchanged
+            "data": {"sync": "1", "source": f"bench-{i}"}, "files": {"file": ("bench.csv", csv_bytes)},
+        },
+        "mentor_import": lambda rng, i: {
+            "method": "POST", "path": "/assign-mentors",
+            "files": {"file": ("mentors.csv", mentor_csv(min(args.upload_rows, args.students), i + 1))},
+        },
+        "academic": lambda rng, i: {
+            "method": "POST", "path": "/academic",
+            # Unique questions so every request misses the answer cache
+            "json": {"student_id": "S0", "query": f"What is topic{rng.randrange(200)} (question {i})?"},
+        },
+    }
+
+
+class FlaskClientTarget:
+    """Sends requests in-process through Flask's test client."""
+
+    def __init__(self, backend):
+        self.app = backend.app
+        self._local = threading.local()
+
+    def send(self, req):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        kwargs = {"method": req["method"], "query_string": req.get("params"), "headers": req.get("headers")}
+        if "json" in req:
+            kwargs["json"] = req["json"]
+        if "files" in req:
+            data = dict(req.get("data", {}))
+            data.update({name: (io.BytesIO(content), filename) for name, (filename, content) in req["files"].items()})
+            kwargs["data"] = data
+            kwargs["content_type"] = "multipart/form-data"
+        response = client.open(req["path"], **kwargs)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+
+class HTTPTarget:
+    """Sends requests over HTTP to a running server."""
+
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url = base_url
+        self._requests = requests
+        self._local = threading.local()
+
+    def send(self, req):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.request(
+            req["method"], f"{self.base_url}{req['path']}",
+            params=req.get("params"), json=req.get("json"), data=req.get("data"), files=req.get("files"),
+            headers=req.get("headers"), timeout=120,
+        )
+        return response.status_code
+
+
+def run_scenario(target, make_request, requests_count, concurrency):
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    counter = iter(range(requests_count))
+
+    def worker(seed):
+        rng = random.Random(seed)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            req = make_request(rng, i)
+            start = time.perf_counter()
+            try:
+                status = target.send(req)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] += 1
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    return {
+        **summarize(latencies),
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "wall_seconds": round(wall, 3),
+        "statuses": dict(statuses),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workdir, args):
+    port = free_port()
+    env = dict(os.environ, BENCH_WORKDIR=workdir, BENCH_LLM_LATENCY=str(args.llm_latency))
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "-c", os.path.join(REPO_DIR, "gunicorn.conf.py"),
+            "--bind", f"127.0.0.1:{port}", "--workers", str(args.workers),
+            "--pythonpath", REPO_DIR, "--chdir", workdir, "benchmark:create_stub_app()",
+        ],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    atexit.register(process.terminate)
+
+    import requests
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited:\n{process.stderr.read().decode()}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/db-pool-stats", timeout=1)
+            return process, f"http://127.0.0.1:{port}"
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 60 seconds")
+
+
+def bench_routes(args):
+    workdir = make_workdir()
+    backend = load_backend(workdir, args.llm_latency)
+    template = seed_routes(backend, args)
+    backend.app.test_client().post(
+        "/set-template",
+        data={"template_type": "Bonafide", "template": (io.BytesIO(template), "bonafide.pdf")},
+        content_type="multipart/form-data",
+    )
+
+    process = None
+    if args.target == "gunicorn":
+        process, base_url = start_gunicorn(workdir, args)
+        target = HTTPTarget(base_url)
+    else:
+        target = FlaskClientTarget(backend)
+
+    scenarios = build_scenarios(args)
+    selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+    results = {}
+    try:
+        for name in selected:
+            requests_count = max(1, args.requests // 10) if name in ("upload_csv", "mentor_import") else args.requests
+            results[name] = run_scenario(target, scenarios[name], requests_count, args.concurrency)
+            print(f"{name}: p50 {results[name]['p50_ms']} ms, {results[name]['throughput_rps']} req/s", file=sys.stderr)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    return {
+        "config": {
+            key: getattr(args, key) for key in (
+                "target", "requests", "concurrency", "workers", "students", "mentors", "leaves",
+                "docs", "upload_rows", "llm_latency",
+            )
+        },
+        "scenarios": results,
+    }
+
+
+# ✅ Leave Submission Stress Test
+def build_leave_submissions(args):
+    """POST /leave requests from a small pool of students, so most submissions overlap an earlier one.
+
+    Every request has its own Idempotency-Key; a --retry-ratio share is sent twice back to back
+    with the same key, as a client retrying a timed-out request would.
+    """
+    rng = random.Random(23)
+    submissions = []
+    for i in range(args.submissions):
+        req = {
+            "method": "POST", "path": "/leave",
+            "json": {"student_id": f"S{rng.randrange(args.students)}", "days": rng.randint(1, 12)},
+            "headers": {"Idempotency-Key": f"stress-{i}"},
+        }
+        submissions.append(req)
+        if rng.random() < args.retry_ratio:
+            submissions.append(req)
+    return submissions
+
+
+def check_leave_invariants(conn, first_id):
+    """Correctness of the leaves created by the stress run (ids >= first_id)."""
+    overlapping_pairs = conn.execute("""
+        SELECT COUNT(*) FROM leave_requests a
+        JOIN leave_requests b ON b.student_id = a.student_id AND b.id > a.id
+            AND a.start_date < b.end_date AND b.start_date < a.end_date
+        WHERE a.id >= ? AND b.id >= ?
+            AND a.status IN ('pending', 'approved') AND b.status IN ('pending', 'approved')
+    """, (first_id, first_id)).fetchone()[0]
+    leaves_created = conn.execute("SELECT COUNT(*) FROM leave_requests WHERE id >= ?", (first_id,)).fetchone()[0]
+    keys_recorded = conn.execute("SELECT COUNT(*) FROM leave_submissions WHERE leave_id >= ?", (first_id,)).fetchone()[0]
+    return {
+        "overlapping_pairs": overlapping_pairs,
+        "leaves_created": leaves_created,
+        "keys_recorded": keys_recorded,
+        # Every request carries a key, so any extra leave came from a retried key
+        "duplicate_leaves": leaves_created - keys_recorded,
+    }
+
+
+def bench_leave_stress(args):
+    workdir = make_workdir()
+    backend = load_backend(workdir)
+    conn = backend.get_db_connection()
+    conn.executemany(
+        "INSERT OR REPLACE INTO mentor_assignments (student_id, mentor_id) VALUES (?, ?)",
+        [(f"S{i}", f"M{i % args.mentors}") for i in range(args.students)]
+    )
+    conn.commit()
+    seed_leave_requests(conn, args.leaves, args.students, args.mentors)
+    first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM leave_requests").fetchone()[0]
+    conn.close()
+
+    process = None
+    if args.target == "gunicorn":
+        args.llm_latency = 0.0
+        process, base_url = start_gunicorn(workdir, args)
+        target = HTTPTarget(base_url)
+    else:
+        target = FlaskClientTarget(backend)
+
+    submissions = build_leave_submissions(args)
+    try:
+        result = run_scenario(target, lambda rng, i: submissions[i], len(submissions), args.concurrency)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+    print(f"leave_submit_stress: p50 {result['p50_ms']} ms, {result['throughput_rps']} req/s", file=sys.stderr)
+
+    conn = backend.get_db_connection()
+    invariants = check_leave_invariants(conn, first_id)
+    conn.close()
+    return {
+        "config": {
+            key: getattr(args, key) for key in (
+                "target", "submissions", "retry_ratio", "concurrency", "workers", "students", "mentors", "leaves",
+            )
+        },
+        "scenarios": {"leave_submit_stress": result},
+        "invariants": invariants,
+        "ok": invariants["overlapping_pairs"] == 0 and invariants["duplicate_leaves"] == 0,
+    }
+
+
+# ✅ Startup Benchmark
+# Runs in a fresh interpreter; works against older commits that initialize at import time
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import backend
+imported = time.perf_counter()
+create_app = getattr(backend, "create_app", None)
+if create_app:
+    create_app(warm=sys.argv[1] == "warm")
+initialized = time.perf_counter()
+backend.app.test_client().get("/student-leave-status", query_string={"student_id": "S1"})
+first_request = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": initialized - imported,
+    "first_request": first_request - initialized,
+    "total": first_request - start,
+    "heavy_modules": sorted(m for m in ("pandas", "PyPDF2", "reportlab", "groq") if m in sys.modules),
+}))
+"""
+
+
+def bench_startup(args):
+    samples = {}
+    heavy_modules = {}
+    for mode in ("lazy", "warm"):
+        for _ in range(args.runs):
+            workdir = make_workdir()
+            env = dict(os.environ, DB_PATH=os.path.join(workdir, "bench.db"), PYTHONPATH=REPO_DIR)
+            env.setdefault("GROQ_API_KEY", "benchmark")
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_PROBE, mode], cwd=workdir, env=env,
+                capture_output=True, text=True, check=True
+            ).stdout
+            timings = json.loads(output.strip().splitlines()[-1])
+            heavy_modules[mode] = timings.pop("heavy_modules")
+            for stage, seconds in timings.items():
+                samples.setdefault(f"{mode}_{stage}", []).append(seconds)
+
+    return {
+        "config": {"runs": args.runs},
+        "heavy_modules_after_first_request": heavy_modules,
+        "scenarios": {stage: summarize(values) for stage, values in samples.items()},
+    }
+
+
+# ✅ Compare Results
+def bench_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["results"]
+
+    comparison = {}
+    for name, after in candidate.get("scenarios", {}).items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        comparison[name] = {
+            metric: {
+                "before": before[metric],
+                "after": after[metric],
+                "change_pct": round((after[metric] - before[metric]) / before[metric] * 100, 1) if before[metric] else None,
+            }
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+            if metric in before and metric in after
+        }
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    queries = subparsers.add_parser("queries", help="Leave listing query latency before/after migrations")
+    queries.add_argument("--rows", type=int, default=1_000_000)
+    queries.add_argument("--students", type=int, default=50_000)
+    queries.add_argument("--mentors", type=int, default=2_000)
+    queries.add_argument("--iterations", type=int, default=200)
+    queries.set_defaults(func=bench_queries)
+
+    routes = subparsers.add_parser("routes", help="Latency/throughput of backend routes")
+    routes.add_argument("--target", choices=["client", "gunicorn"], default="client")
+    routes.add_argument("--scenarios", help="Comma-separated subset of scenarios to run")
+    routes.add_argument("--requests", type=int, default=200, help="Requests per scenario (uploads/imports run a tenth)")
+    routes.add_argument("--concurrency", type=int, default=4)
+    routes.add_argument("--workers", type=int, default=2, help="Gunicorn worker processes")
+    routes.add_argument("--students", type=int, default=5_000)
+    routes.add_argument("--mentors", type=int, default=200)
+    routes.add_argument("--leaves", type=int, default=100_000, help="Leave requests seeded before the run")
+    routes.add_argument("--docs", type=int, default=2_000, help="Academic documents seeded before the run")
+    routes.add_argument("--upload-rows", type=int, default=5_000, help="Rows in the uploaded CSV")
+    routes.add_argument("--llm-latency", type=float, default=0.05, help="Seconds the stub LLM takes per call")
+    routes.set_defaults(func=bench_routes)
+
+    startup = subparsers.add_parser("startup", help="Cold import, create_app and first-request time")
+    startup.add_argument("--runs", type=int, default=5, help="Fresh interpreters per mode (lazy and warm)")
+    startup.set_defaults(func=bench_startup)
+
+    stress = subparsers.add_parser("leave-stress", help="Concurrent leave submissions: throughput and correctness")
+    stress.add_argument("--target", choices=["client", "gunicorn"], default="client")
+    stress.add_argument("--submissions", type=int, default=2_000)
+    stress.add_argument("--retry-ratio", type=float, default=0.2, help="Share of submissions resent with the same key")
+    stress.add_argument("--concurrency", type=int, default=32)
+    stress.add_argument("--workers", type=int, default=4, help="Gunicorn worker processes")
+    stress.add_argument("--students", type=int, default=200, help="Few students, so submissions contend")
+    stress.add_argument("--mentors", type=int, default=20)
+    stress.add_argument("--leaves", type=int, default=100_000, help="Historical leave requests seeded before the run")
+    stress.set_defaults(func=bench_leave_stress)
+
+    compare = subparsers.add_parser("compare", help="Compare two saved `routes`, `startup` or `leave-stress` results")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.set_defaults(func=bench_compare)
+
+    args = parser.parse_args()
+    results = {
+        "benchmark": args.command,
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "results": args.func(args),
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+# Gunicorn settings for the Flask backend: gunicorn -c gunicorn.conf.py "backend:create_app(warm=True)"
+import os
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", 2))
+
+# Threaded workers: /academic waits on the bounded LLM executor (LLM_MAX_CONCURRENCY running
+# plus LLM_QUEUE_SIZE queued per process), so keep threads above that sum and the remaining
+# threads stay free for leave and certificate requests.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+
+# Load the app once in the master (migrations run once) and fork the workers from it, so the
+# modules create_app(warm=True) imports are shared copy-on-write. GUNICORN_PRELOAD=0 loads per worker.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() not in ("0", "false", "no")
@@ -0,0 +1,168 @@
+"""Academic answer cache and SSE streaming, with a local stub in place of the Groq client."""
+import io
+import json
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import benchmark  # noqa: E402
+
+
+class CountingLLMClient(benchmark.StubLLMClient):
+    """StubLLMClient that counts calls, so tests can tell a cache hit from a fresh answer."""
+
+    def __init__(self):
+        super().__init__(latency=0)
+        self.calls = 0
+
+    def create(self, messages, model, stream=False, **kwargs):
+        self.calls += 1
+        return super().create(messages, model, stream=stream, **kwargs)
+
+
+class FailingStreamClient:
+    """Streams one token and then fails, like a connection dropped mid-answer."""
+
+    def __init__(self):
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, messages, model, stream=False, **kwargs):
+        def chunks():
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content="Partial"))])
+            raise ConnectionError("stream dropped")
+        return chunks()
+
+
+@pytest.fixture(scope="module")
+def backend(tmp_path_factory):
+    cwd = os.getcwd()
+    os.environ["JOB_WORKER_MODE"] = "external"
+    backend = benchmark.load_backend(str(tmp_path_factory.mktemp("backend")))
+    client = backend.app.test_client()
+    response = client.post("/upload-data", data={
+        "sync": "1", "file": (io.BytesIO(b'{"syllabus": "Thermodynamics covers entropy and heat engines."}'), "syllabus.json"),
+    })
+    assert response.status_code == 200
+    yield backend
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def llm(backend, monkeypatch):
+    stub = CountingLLMClient()
+    monkeypatch.setattr(backend, "client", stub)
+    conn = backend.get_db_connection()
+    backend.answer_cache.invalidate(conn.cursor())
+    conn.commit()
+    conn.close()
+    backend.answer_cache.hits = backend.answer_cache.misses = 0
+    return stub
+
+
+def ask(backend, query, **extra):
+    return backend.app.test_client().post("/academic", json={"student_id": "S1", "query": query, **extra})
+
+
+def sse_events(response):
+    body = response.get_data(as_text=True)
+    return [json.loads(block[len("data: "):]) for block in body.split("\n\n") if block.startswith("data: ")]
+
+
+def cache_entries(backend):
+    conn = backend.get_db_connection()
+    keys = [row[0] for row in conn.execute("SELECT key FROM academic_answer_cache")]
+    conn.close()
+    return keys
+
+
+def test_repeated_question_is_answered_from_cache(backend, llm):
+    first = ask(backend, "What is entropy?").get_json()
+    second = ask(backend, "What is entropy?").get_json()
+
+    assert "cached" not in first
+    assert second == {"response": first["response"], "cached": True}
+    assert llm.calls == 1
+    assert backend.answer_cache.stats()["hits"] == 1
+    assert backend.answer_cache.stats()["misses"] == 1
+
+
+def test_key_ignores_case_and_punctuation(backend, llm):
+    cache = backend.answer_cache
+    assert cache.key("What is  ENTROPY?", "ctx") == cache.key("what is entropy", "ctx")
+    assert cache.key("what is entropy", "ctx") != cache.key("what is entropy", "other ctx")
+
+    ask(backend, "What is  ENTROPY?")
+    assert ask(backend, "what is entropy").get_json()["cached"] is True
+    assert llm.calls == 1
+
+
+def test_expired_entry_is_a_miss(backend, llm, monkeypatch):
+    monkeypatch.setattr(backend.answer_cache, "ttl", 60)
+    backend.answer_cache.put("k", "q", "answer")
+    conn = backend.get_db_connection()
+    conn.execute("UPDATE academic_answer_cache SET created_at = created_at - 61 WHERE key = 'k'")
+    conn.commit()
+    conn.close()
+
+    assert backend.answer_cache.get("k") is None
+    assert cache_entries(backend) == []
+    assert backend.answer_cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(backend, llm, monkeypatch):
+    monkeypatch.setattr(backend.answer_cache, "max_entries", 2)
+    backend.answer_cache.put("k1", "q1", "a1")
+    backend.answer_cache.put("k2", "q2", "a2")
+    conn = backend.get_db_connection()
+    conn.execute("UPDATE academic_answer_cache SET last_hit_at = 0 WHERE key = 'k2'")
+    conn.commit()
+    conn.close()
+
+    backend.answer_cache.put("k3", "q3", "a3")
+    assert sorted(cache_entries(backend)) == ["k1", "k3"]
+
+
+def test_upload_that_changes_the_corpus_invalidates(backend, llm):
+    client = backend.app.test_client()
+
+    def upload(content):
+        response = client.post("/upload-data", data={"sync": "1", "file": (io.BytesIO(content), "notes.json")})
+        assert response.status_code == 200
+        return response.get_json()
+
+    upload(b'{"notes": "Heat engines convert heat into work."}')
+    ask(backend, "What is entropy?")
+    assert len(cache_entries(backend)) == 1
+
+    # Identical re-upload: nothing changed, cached answers stay
+    assert upload(b'{"notes": "Heat engines convert heat into work."}')["skipped"] is True
+    assert len(cache_entries(backend)) == 1
+
+    upload(b'{"notes": "Entropy never decreases in an isolated system."}')
+    assert cache_entries(backend) == []
+
+
+def test_stream_sends_tokens_then_done_and_caches(backend, llm):
+    events = sse_events(ask(backend, "Explain heat engines", stream=True))
+
+    assert [event for event in events if "token" not in event] == [{"done": True}]
+    assert events[-1] == {"done": True}
+    answer = "".join(event["token"] for event in events[:-1])
+    assert answer == "This is a benchmark answer."
+
+    cached = sse_events(ask(backend, "Explain heat engines", stream=True))
+    assert cached == [{"token": answer}, {"done": True, "cached": True}]
+    assert llm.calls == 1
+
+
+def test_stream_failure_sends_error_and_is_not_cached(backend, llm, monkeypatch):
+    monkeypatch.setattr(backend, "client", FailingStreamClient())
+    events = sse_events(ask(backend, "Explain entropy", stream=True))
+
+    assert events[0] == {"token": "Partial"}
+    assert events[1] == {"error": "❌ AI Error: stream dropped"}
+    assert len(events) == 2
+    assert cache_entries(backend) == []